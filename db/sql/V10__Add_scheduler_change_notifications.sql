@@ -0,0 +1,65 @@
+-- ================================
+-- Migration: V10__Add_scheduler_change_notifications.sql
+-- Description: Publish notification preference and blocked chat changes to schedulers via NOTIFY
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Publish the new notification settings of a user on the scheduler_changes channel
+CREATE OR REPLACE FUNCTION notify_user_preferences_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('scheduler_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', OLD.chat_id
+        )::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('scheduler_changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', NEW.chat_id,
+        'notification_time', NEW.notification_time, 'timezone', NEW.timezone
+    )::text);
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- Publish chats blocking or unblocking the bot on the same channel
+CREATE OR REPLACE FUNCTION notify_blocked_chats_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('scheduler_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', OLD.chat_id
+        )::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('scheduler_changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', NEW.chat_id
+    )::text);
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS notify_user_preferences_insert_delete ON user_preferences;
+CREATE TRIGGER notify_user_preferences_insert_delete
+    AFTER INSERT OR DELETE ON user_preferences
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_user_preferences_change();
+
+-- Only changes that affect scheduling are published
+DROP TRIGGER IF EXISTS notify_user_preferences_update ON user_preferences;
+CREATE TRIGGER notify_user_preferences_update
+    AFTER UPDATE ON user_preferences
+    FOR EACH ROW
+    WHEN (OLD.notification_time IS DISTINCT FROM NEW.notification_time OR OLD.timezone IS DISTINCT FROM NEW.timezone)
+    EXECUTE FUNCTION notify_user_preferences_change();
+
+DROP TRIGGER IF EXISTS notify_blocked_chats_change ON blocked_chats;
+CREATE TRIGGER notify_blocked_chats_change
+    AFTER INSERT OR DELETE ON blocked_chats
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_blocked_chats_change();
+
+-- Add comments for documentation
+COMMENT ON FUNCTION notify_user_preferences_change() IS 'Sends user preference changes to scheduler workers listening on scheduler_changes';
+COMMENT ON FUNCTION notify_blocked_chats_change() IS 'Sends blocked chat changes to scheduler workers listening on scheduler_changes';
@@ -0,0 +1,30 @@
+-- ================================
+-- Migration: V11__Add_bulk_preferences_import.sql
+-- Description: Let bulk imports of user preferences skip per-row scheduler notifications
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Same as V10, except that nothing is published while the session sets
+-- mainote.bulk_import; the import sends a single RELOAD notification instead
+CREATE OR REPLACE FUNCTION notify_user_preferences_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('mainote.bulk_import', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('scheduler_changes', json_build_object(
+            'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', OLD.chat_id
+        )::text);
+        RETURN OLD;
+    END IF;
+    PERFORM pg_notify('scheduler_changes', json_build_object(
+        'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', NEW.chat_id,
+        'notification_time', NEW.notification_time, 'timezone', NEW.timezone
+    )::text);
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+COMMENT ON FUNCTION notify_user_preferences_change() IS 'Sends user preference changes to scheduler workers listening on scheduler_changes, except during bulk imports';
@@ -0,0 +1,26 @@
+-- ================================
+-- Migration: V4__Add_notes_sync_state.sql
+-- Description: Track background Notion sync for notes captured locally by the bot
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Add sync tracking columns to notes table
+ALTER TABLE notes
+ADD COLUMN IF NOT EXISTS sync_state TEXT,
+ADD COLUMN IF NOT EXISTS sync_attempts INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS next_sync_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS last_sync_error TEXT;
+
+-- Make uuid_id usable as a lookup key for bot callbacks
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_uuid_id_unique ON notes(uuid_id);
+
+-- Index the sync work queue (only pending rows are scanned by the syncer)
+CREATE INDEX IF NOT EXISTS idx_notes_sync_pending ON notes(next_sync_at, created_at)
+    WHERE sync_state = 'pending';
+
+-- Add comments for new columns
+COMMENT ON COLUMN notes.sync_state IS 'Notion sync state: pending, synced, failed (NULL when not managed by the bot)';
+COMMENT ON COLUMN notes.sync_attempts IS 'Number of failed Notion push attempts';
+COMMENT ON COLUMN notes.next_sync_at IS 'Earliest time the syncer may (re)try pushing the note';
+COMMENT ON COLUMN notes.last_sync_error IS 'Error message from the last failed Notion push';
@@ -0,0 +1,43 @@
+-- ================================
+-- Migration: V5__Add_notion_mirror.sql
+-- Description: Mirror the Notion database into notes for local task queries
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Track which Notion database a page belongs to and when it last changed there
+ALTER TABLE notes
+ADD COLUMN IF NOT EXISTS notion_database_id TEXT,
+ADD COLUMN IF NOT EXISTS notion_last_edited_at TIMESTAMPTZ;
+
+-- One local row per Notion page (required for mirror upserts)
+DROP INDEX IF EXISTS idx_notes_notion_page_id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_notion_page_id ON notes(notion_page_id) WHERE notion_page_id IS NOT NULL;
+
+-- Serve active-task queries for a database from the index
+CREATE INDEX IF NOT EXISTS idx_notes_notion_database_status ON notes(notion_database_id, status, category)
+    WHERE notion_page_id IS NOT NULL;
+
+-- Incremental sync cursor per mirrored Notion database
+CREATE TABLE IF NOT EXISTS notion_sync_cursors (
+    database_id TEXT NOT NULL,
+    last_edited_time TIMESTAMPTZ,
+    last_synced_at TIMESTAMPTZ,
+    last_full_sync_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (database_id)
+);
+
+CREATE TRIGGER update_notion_sync_cursors_updated_at
+    BEFORE UPDATE ON notion_sync_cursors
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Add comments for documentation
+COMMENT ON COLUMN notes.notion_database_id IS 'Notion database the page belongs to';
+COMMENT ON COLUMN notes.notion_last_edited_at IS 'last_edited_time of the Notion page at the last mirror pass';
+COMMENT ON TABLE notion_sync_cursors IS 'Incremental Notion to Postgres mirror state per database';
+COMMENT ON COLUMN notion_sync_cursors.last_edited_time IS 'Highest Notion last_edited_time mirrored so far';
+COMMENT ON COLUMN notion_sync_cursors.last_synced_at IS 'Time of the last successful mirror pass';
+COMMENT ON COLUMN notion_sync_cursors.last_full_sync_at IS 'Time of the last full pass that also detected removed pages';
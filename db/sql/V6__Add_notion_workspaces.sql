@@ -0,0 +1,29 @@
+-- ================================
+-- Migration: V6__Add_notion_workspaces.sql
+-- Description: Per-chat Notion integration credentials and target databases
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Create notion_workspaces table
+CREATE TABLE IF NOT EXISTS notion_workspaces (
+    chat_id TEXT NOT NULL,
+    api_key TEXT NOT NULL,
+    database_id TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_notion_workspaces_database_id ON notion_workspaces(database_id);
+
+CREATE TRIGGER update_notion_workspaces_updated_at
+    BEFORE UPDATE ON notion_workspaces
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Add comments for documentation
+COMMENT ON TABLE notion_workspaces IS 'Notion integration used by a chat instead of the deployment default';
+COMMENT ON COLUMN notion_workspaces.chat_id IS 'Telegram chat ID (primary key)';
+COMMENT ON COLUMN notion_workspaces.api_key IS 'Notion internal integration secret for the chat';
+COMMENT ON COLUMN notion_workspaces.database_id IS 'Notion database notes are written to';
@@ -0,0 +1,20 @@
+-- ================================
+-- Migration: V7__Add_blocked_chats.sql
+-- Description: Chats that blocked the bot are skipped by morning notifications
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Create blocked_chats table
+CREATE TABLE IF NOT EXISTS blocked_chats (
+    chat_id TEXT NOT NULL,
+    reason TEXT,
+    blocked_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (chat_id)
+);
+
+-- Add comments for documentation
+COMMENT ON TABLE blocked_chats IS 'Chats where Telegram refused delivery (bot blocked, user deactivated)';
+COMMENT ON COLUMN blocked_chats.chat_id IS 'Telegram chat ID (primary key)';
+COMMENT ON COLUMN blocked_chats.reason IS 'Error returned by Telegram';
+COMMENT ON COLUMN blocked_chats.blocked_at IS 'When delivery was first refused';
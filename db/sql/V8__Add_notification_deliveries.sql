@@ -0,0 +1,28 @@
+-- ================================
+-- Migration: V8__Add_notification_deliveries.sql
+-- Description: Ledger of morning digests, at most one per chat and local day
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Create notification_deliveries table
+CREATE TABLE IF NOT EXISTS notification_deliveries (
+    chat_id TEXT NOT NULL,
+    local_date DATE NOT NULL,
+    scheduled_at TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL DEFAULT 'claimed',
+    error TEXT,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TIMESTAMPTZ,
+    PRIMARY KEY (chat_id, local_date),
+    CONSTRAINT notification_deliveries_status_check CHECK (status IN ('claimed', 'sent', 'blocked', 'failed'))
+);
+
+-- Pruning old entries
+CREATE INDEX IF NOT EXISTS idx_notification_deliveries_local_date ON notification_deliveries(local_date);
+
+-- Add comments for documentation
+COMMENT ON TABLE notification_deliveries IS 'Morning digests claimed per chat and local day; the primary key guarantees at-most-once delivery';
+COMMENT ON COLUMN notification_deliveries.local_date IS 'Date in the chat''s timezone the digest belongs to';
+COMMENT ON COLUMN notification_deliveries.scheduled_at IS 'UTC time the digest was due';
+COMMENT ON COLUMN notification_deliveries.status IS 'claimed (sending), sent, blocked or failed';
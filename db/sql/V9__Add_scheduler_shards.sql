@@ -0,0 +1,29 @@
+-- ================================
+-- Migration: V9__Add_scheduler_shards.sql
+-- Description: Leases that split morning notification scheduling between workers
+-- Author: System Migration
+-- Date: 2026-10-18
+-- ================================
+
+-- Create scheduler_shards table (one row per shard of the chat ID space)
+CREATE TABLE IF NOT EXISTS scheduler_shards (
+    shard INTEGER NOT NULL,
+    owner TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    acquired_at TIMESTAMPTZ,
+    PRIMARY KEY (shard)
+);
+
+-- Create scheduler_workers table (live workers, used to compute a fair share of shards)
+CREATE TABLE IF NOT EXISTS scheduler_workers (
+    worker_id TEXT NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (worker_id)
+);
+
+-- Add comments for documentation
+COMMENT ON TABLE scheduler_shards IS 'Scheduler shard leases; a shard is scheduled only by the worker holding an unexpired lease';
+COMMENT ON COLUMN scheduler_shards.owner IS 'Worker ID holding the lease, NULL when released';
+COMMENT ON COLUMN scheduler_shards.lease_expires_at IS 'Other workers may take the shard over after this time';
+COMMENT ON TABLE scheduler_workers IS 'Scheduler worker heartbeats';
@@ -1,20 +1,23 @@
 from telegram import Bot, Update
 from telegram.ext import ContextTypes
-from mainote_bot.config import TELEGRAM_BOT_TOKEN, ERROR_PROCESSING_REQUEST
+from mainote_bot.config import TELEGRAM_BOT_TOKEN, ERROR_PROCESSING_REQUEST, MORNING_DIGEST_MAX_TASKS
 from mainote_bot.utils.logging import logger
-from mainote_bot.notion.tasks import update_note_type
+from mainote_bot.bot.messages import build_note_type_keyboard
+from mainote_bot.bot.type_updates import queue_note_type_change
+from mainote_bot.notion.digest import get_cached_digest_page, stream_chat_digest_pages, get_digest_source, build_digest_keyboard
 import mainote_bot.user_preferences as user_preferences
 import pytz
-from mainote_bot.scheduler.notifications import force_notification_recalculation
+from mainote_bot.scheduler.notifications import reschedule_user
 from datetime import datetime
 
-async def send_callback_response(bot, query, text):
+async def send_callback_response(bot, query, text, reply_markup=None):
     """Send a response to a callback query."""
     try:
         await bot.edit_message_text(
             chat_id=query.message.chat_id,
             message_id=query.message.message_id,
-            text=text
+            text=text,
+            reply_markup=reply_markup
         )
     except Exception as e:
         logger.error(f"Error sending callback response: {str(e)}", exc_info=True)
@@ -38,16 +41,24 @@ async def handle_note_type_callback(bot, query, data_value):
         "personal": "Личное"
     }
 
-    # Update the note type in Notion
-    if update_note_type(page_id, note_type):
-        # Send confirmation
+    async def reconcile(failed_type):
+        # The optimistic confirmation was wrong: say so and offer the buttons again
         await send_callback_response(
-            bot, 
-            query, 
-            f"Заметка сохранена как {type_names.get(note_type, note_type)} 👍"
+            bot,
+            query,
+            f"Не удалось сохранить заметку как {type_names.get(failed_type, failed_type)} 😔\nПопробуйте ещё раз:",
+            reply_markup=build_note_type_keyboard(page_id)
         )
-    else:
-        await send_callback_response(bot, query, ERROR_PROCESSING_REQUEST)
+
+    # Confirm right away and keep the buttons so the type can still be changed;
+    # the write happens in the background, merged with further taps on this note
+    queue_note_type_change(page_id, note_type, query.message.chat_id, reconcile)
+    await send_callback_response(
+        bot,
+        query,
+        f"Заметка сохранена как {type_names.get(note_type, note_type)} 👍",
+        reply_markup=build_note_type_keyboard(page_id)
+    )
 
 async def handle_time_callback(bot, query, time_value):
     """Handle notification time selection callback."""
@@ -72,8 +83,8 @@ async def handle_time_callback(bot, query, time_value):
             if await user_preferences.set_user_notification_time(chat_id, time_value):
                 logger.info(f"Set notification time to {time_value} for chat ID {chat_id}")
                 
-                # Force notification recalculation
-                force_notification_recalculation()
+                # Move this user's entry in the notification queue
+                await reschedule_user(chat_id, notification_time=time_value)
 
                 # Get timezone offset for display
                 tz = pytz.timezone(user_timezone)
@@ -122,8 +133,8 @@ async def handle_timezone_callback(bot, query, timezone_value):
         if await user_preferences.set_user_timezone(chat_id, timezone_value):
             logger.info(f"Set timezone to {timezone_value} for chat ID {chat_id}")
             
-            # Force notification recalculation
-            force_notification_recalculation()
+            # Move this user's entry in the notification queue
+            await reschedule_user(chat_id, timezone=timezone_value)
 
             # Send confirmation
             await send_callback_response(
@@ -147,6 +158,27 @@ async def handle_timezone_callback(bot, query, timezone_value):
             "Неверный формат часового пояса. Пожалуйста, выберите из предложенных вариантов."
         )
 
+async def handle_digest_callback(bot, query, data_value):
+    """Handle digest page navigation callback."""
+    # Split the value for digest:digest_id:page format
+    digest_parts = data_value.split(":", 1)
+    try:
+        digest_id = int(digest_parts[0])
+        page = int(digest_parts[1])
+    except (ValueError, IndexError):
+        logger.error(f"Invalid digest callback data format: {data_value}")
+        await send_callback_response(bot, query, ERROR_PROCESSING_REQUEST)
+        return
+
+    chat_id = query.message.chat_id
+    text, total = get_cached_digest_page(digest_id, page, await get_digest_source(chat_id))
+    if text is None:
+        # The rendered digest was evicted or rendered elsewhere: show the current plan from the start
+        digest_id, pages = await stream_chat_digest_pages(chat_id, limit=MORNING_DIGEST_MAX_TASKS)
+        page, text, total = 0, pages[0], len(pages)
+
+    await send_callback_response(bot, query, text, reply_markup=build_digest_keyboard(digest_id, page, total))
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button clicks from inline keyboards."""
     try:
@@ -170,6 +202,8 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await handle_time_callback(local_bot, query, data_value)
         elif data_type == "timezone":
             await handle_timezone_callback(local_bot, query, data_value)
+        elif data_type == "digest":
+            await handle_digest_callback(local_bot, query, data_value)
         else:
             logger.error(f"Unrecognized callback data type: {data_type} with value: {data_value}")
             await send_callback_response(local_bot, query, ERROR_PROCESSING_REQUEST)
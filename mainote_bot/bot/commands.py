@@ -1,11 +1,15 @@
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
-from mainote_bot.config import TELEGRAM_BOT_TOKEN, NOTIFICATION_CHAT_IDS
+from mainote_bot.config import (
+    TELEGRAM_BOT_TOKEN, MORNING_DIGEST_MAX_TASKS, MORNING_DIGEST_PAGED
+)
 from mainote_bot.utils.logging import logger
-from mainote_bot.notion.tasks import get_active_tasks, format_morning_notification
+from mainote_bot.notion.digest import stream_chat_digest_pages, send_digest
 import mainote_bot.user_preferences as user_preferences
 import pytz
-from mainote_bot.scheduler.notifications import force_notification_recalculation
+from mainote_bot.scheduler.notifications import reschedule_user, unblock_recipient
+from mainote_bot.notion.client import create_probe_client, register_tenant_client
+from mainote_bot.notion.workspaces import save_workspace, remove_workspace
 from timezonefinder import TimezoneFinder
 from datetime import datetime
 
@@ -13,6 +17,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /start command."""
     try:
         chat_id = update.effective_chat.id
+
+        # A user who blocked the bot earlier is back: resume their notifications
+        await unblock_recipient(chat_id)
         
         # First try to get timezone from user's location if available
         if update.effective_message and update.effective_message.location:
@@ -61,7 +68,7 @@ async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # Save user's timezone
                 if await user_preferences.set_user_timezone(chat_id, timezone_str):
                     logger.info(f"Set timezone to {timezone_str} for chat ID {chat_id}")
-                    force_notification_recalculation()
+                    await reschedule_user(chat_id, timezone=timezone_str)
                     
                     # Get timezone offset for display
                     tz = pytz.timezone(timezone_str)
@@ -118,6 +125,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                  "/help - показать это сообщение\n"
                  "/morning - получить утренний план на день\n"
                  "/settime - настроить время утренних уведомлений (можно указать время напрямую: /settime 14:30)\n"
+                 "/setnotion - сохранять заметки в свою базу Notion\n"
                  
         )
         logger.info(f"Sent help message to {chat_id}")
@@ -129,20 +137,11 @@ async def morning_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         chat_id = update.effective_chat.id
 
-        # Add this chat_id to notification recipients if not already there
-        chat_id_str = str(chat_id)
-        if chat_id_str not in NOTIFICATION_CHAT_IDS and NOTIFICATION_CHAT_IDS != ['']:
-            logger.info(f"Adding chat ID {chat_id} to notification recipients")
-            # Note: This won't persist after restart, would need to save to a file or database
-
-        # Get active tasks
-        tasks = await get_active_tasks()
-
-        # Format notification message
-        message = await format_morning_notification(tasks)
+        # Get the digest of this chat's own tasks
+        digest_id, pages = await stream_chat_digest_pages(chat_id, limit=MORNING_DIGEST_MAX_TASKS)
 
         # Send the notification
-        await context.bot.send_message(chat_id=chat_id, text=message)
+        await send_digest(context.bot, chat_id, digest_id, pages, paged=MORNING_DIGEST_PAGED)
         logger.info(f"Sent manual morning notification to {chat_id}")
     except Exception as e:
         logger.error(f"Error in morning command: {str(e)}", exc_info=True)
@@ -157,7 +156,7 @@ async def settimezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         chat_id = update.effective_chat.id
 
         # Get current timezone for this user
-        current_timezone = user_preferences.get_user_timezone(chat_id)
+        current_timezone = await user_preferences.get_user_timezone(chat_id)
         current_timezone_msg = f"Текущий часовой пояс: {current_timezone}" if current_timezone else "Часовой пояс не настроен"
 
         # Common timezones for Russia and nearby regions
@@ -228,6 +227,7 @@ async def settime_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     # Save user preference
                     if await user_preferences.set_user_notification_time(chat_id, time_arg):
                         logger.info(f"Set notification time to {time_arg} for chat ID {chat_id}")
+                        await reschedule_user(chat_id, notification_time=time_arg)
 
                         # Create a new bot instance for this event loop
                         local_bot = Bot(token=TELEGRAM_BOT_TOKEN)
@@ -297,4 +297,64 @@ async def settime_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await local_bot.send_message(
             chat_id=update.effective_chat.id,
             text="Произошла ошибка при настройке времени уведомлений. Попробуйте позже."
-        )
\ No newline at end of file
+        )
+
+async def setnotion_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /setnotion command to connect the chat to its own Notion database."""
+    chat_id = update.effective_chat.id
+    try:
+        args = context.args or []
+
+        # Any argument other than a lone "off" may be a secret, so do not leave it in the chat history
+        if args and not (len(args) == 1 and args[0].lower() == "off"):
+            try:
+                await update.effective_message.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete /setnotion message in chat {chat_id}: {str(e)}")
+
+        if args and args[0].lower() == "off":
+            if await remove_workspace(chat_id):
+                text = "Заметки снова сохраняются в общую базу Notion."
+            else:
+                text = "Произошла ошибка при отключении вашей базы Notion. Попробуйте позже."
+            await context.bot.send_message(chat_id=chat_id, text=text)
+            return
+
+        if len(args) != 2:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text="Чтобы сохранять заметки в свою базу Notion, отправьте:\n"
+                     "/setnotion <токен интеграции> <ID базы данных>\n\n"
+                     "Чтобы вернуться к общей базе: /setnotion off"
+            )
+            return
+
+        api_key, database_id = args
+
+        # Check that the integration can access the database before saving it
+        client = create_probe_client(api_key)
+        try:
+            await client.databases.retrieve(database_id=database_id)
+        except Exception as e:
+            logger.warning(f"Notion workspace check failed for chat {chat_id}: {str(e)}")
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text="Не удалось открыть базу данных Notion. Проверьте токен, ID базы и что база доступна интеграции."
+            )
+            return
+
+        if await save_workspace(chat_id, api_key, database_id):
+            register_tenant_client(api_key, client)
+            logger.info(f"Connected chat {chat_id} to its own Notion database")
+            await context.bot.send_message(chat_id=chat_id, text="✅ Заметки теперь сохраняются в вашу базу Notion.")
+        else:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text="Произошла ошибка при сохранении настроек Notion. Попробуйте позже."
+            )
+    except Exception as e:
+        logger.error(f"Error in setnotion command: {str(e)}", exc_info=True)
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="Произошла ошибка при настройке Notion. Попробуйте позже."
+        )
@@ -1,7 +1,22 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from mainote_bot.utils.logging import logger
-from mainote_bot.notion.tasks import create_note
+from mainote_bot.notion.tasks import create_note, make_note_title
+from mainote_bot.notion.sync import wake_note_sync
+from mainote_bot.notion.workspaces import get_workspace
+from mainote_bot.database import insert_note
+from mainote_bot.scheduler.notifications import unblock_recipient
+
+def build_note_type_keyboard(note_id):
+    """Build the inline keyboard used to pick a note type."""
+    keyboard = [
+        [
+            InlineKeyboardButton("💡 Идея", callback_data=f"type:idea:{note_id}"),
+            InlineKeyboardButton("✅ Задача", callback_data=f"type:task:{note_id}"),
+            InlineKeyboardButton("📝 Личное", callback_data=f"type:personal:{note_id}")
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming messages."""
@@ -12,25 +27,30 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         logger.info(f"Received message from {chat_id}: {text}")
 
-        # Save to Notion
-        page = create_note(text)
-        logger.info(f"Saved to Notion with ID: {page['id']}")
+        # A user who blocked the bot earlier is back: resume their notifications
+        await unblock_recipient(chat_id)
 
-        # Create inline keyboard with buttons
-        keyboard = [
-            [
-                InlineKeyboardButton("💡 Идея", callback_data=f"type:idea:{page['id']}"),
-                InlineKeyboardButton("✅ Задача", callback_data=f"type:task:{page['id']}"),
-                InlineKeyboardButton("📝 Личное", callback_data=f"type:personal:{page['id']}")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Save locally first; the background syncer pushes the note to Notion
+        note_id = await insert_note(
+            chat_id,
+            text,
+            title=make_note_title(text),
+            metadata={"telegram_message_id": message.message_id}
+        )
+        if note_id:
+            logger.info(f"Saved note {note_id} locally, queued for Notion sync")
+            wake_note_sync()
+        else:
+            # Database unavailable: fall back to writing straight to Notion
+            page = await create_note(text, workspace=await get_workspace(chat_id))
+            logger.info(f"Saved to Notion with ID: {page['id']}")
+            note_id = page['id']
 
         # Send confirmation with buttons
         await context.bot.send_message(
             chat_id=chat_id,
-            text="Заметка добавлена в Notion 📘\nХотите её отметить как:",
-            reply_markup=reply_markup
+            text="Заметка сохранена 📘\nХотите её отметить как:",
+            reply_markup=build_note_type_keyboard(note_id)
         )
 
     except Exception as e:
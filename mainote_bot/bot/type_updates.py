@@ -0,0 +1,70 @@
+import asyncio
+from mainote_bot.config import NOTE_TYPE_UPDATE_WINDOW
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.tasks import update_note_type
+from mainote_bot.notion.workspaces import get_workspace
+from mainote_bot.database import set_note_category
+
+# Type changes waiting to be written, keyed by the note ID from the button
+_pending = {}
+
+async def apply_note_type(note_id, note_type, chat_id):
+    """Persist a note type locally and in Notion. Returns True on success."""
+    # Notes captured locally carry their note UUID; older buttons carry the Notion page ID
+    note = await set_note_category(note_id, note_type)
+    if note and not note['notion_page_id']:
+        # Not pushed yet: the syncer creates the page with the new type
+        return True
+
+    workspace = await get_workspace(chat_id)
+    page_id = note['notion_page_id'] if note else note_id
+    return await update_note_type(page_id, note_type, workspace=workspace)
+
+def queue_note_type_change(note_id, note_type, chat_id, on_failure):
+    """Queue a type change, merging it with pending changes for the same note.
+
+    Only the last type chosen within NOTE_TYPE_UPDATE_WINDOW seconds is
+    written. ``on_failure(note_type)`` is awaited if the final write fails.
+    """
+    entry = _pending.get(note_id)
+    if entry is not None:
+        entry['note_type'] = note_type
+        entry['on_failure'] = on_failure
+        entry['merged'] += 1
+        return
+
+    entry = {'note_type': note_type, 'chat_id': chat_id, 'on_failure': on_failure, 'merged': 0}
+    entry['task'] = asyncio.create_task(_write_note_type(note_id, entry))
+    _pending[note_id] = entry
+
+async def _write_note_type(note_id, entry):
+    """Write the latest queued type once the merge window has passed."""
+    note_type = entry['note_type']
+    success = False
+    try:
+        await asyncio.sleep(NOTE_TYPE_UPDATE_WINDOW)
+        while True:
+            note_type = entry['note_type']
+            success = await apply_note_type(note_id, note_type, entry['chat_id'])
+            # A tap that arrived during the write wins over the value just written
+            if entry['note_type'] == note_type:
+                break
+    except Exception as e:
+        logger.error(f"Error writing note type for {note_id}: {str(e)}", exc_info=True)
+    finally:
+        _pending.pop(note_id, None)
+
+    if entry['merged']:
+        logger.info(f"Merged {entry['merged']} type changes for note {note_id} into one write")
+    if not success:
+        try:
+            await entry['on_failure'](note_type)
+        except Exception as e:
+            logger.error(f"Error reconciling note type for {note_id}: {str(e)}", exc_info=True)
+
+async def flush_note_type_changes():
+    """Wait for all queued type changes to be written."""
+    tasks = [entry['task'] for entry in list(_pending.values())]
+    if tasks:
+        logger.info(f"Flushing {len(tasks)} pending note type changes")
+        await asyncio.gather(*tasks, return_exceptions=True)
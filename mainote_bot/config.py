@@ -11,6 +11,51 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 NOTION_API_KEY = os.getenv('NOTION_API_KEY')
 NOTION_DATABASE_ID = os.getenv('NOTION_DATABASE_ID')
 
+# Notion HTTP connection pool and timeouts (seconds)
+NOTION_MAX_CONNECTIONS = int(os.getenv('NOTION_MAX_CONNECTIONS', '10'))
+NOTION_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('NOTION_MAX_KEEPALIVE_CONNECTIONS', '5'))
+NOTION_KEEPALIVE_EXPIRY = float(os.getenv('NOTION_KEEPALIVE_EXPIRY', '30'))
+NOTION_CONNECT_TIMEOUT = float(os.getenv('NOTION_CONNECT_TIMEOUT', '5'))
+NOTION_REQUEST_TIMEOUT = float(os.getenv('NOTION_REQUEST_TIMEOUT', '15'))
+NOTION_POOL_TIMEOUT = float(os.getenv('NOTION_POOL_TIMEOUT', '10'))
+# Notion request rate limit (requests per second per integration) and burst size
+NOTION_RATE_LIMIT = float(os.getenv('NOTION_RATE_LIMIT', '3'))
+NOTION_RATE_BURST = int(os.getenv('NOTION_RATE_BURST', '3'))
+# Retries for requests rejected with HTTP 429
+NOTION_MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', '3'))
+# Per-chat Notion workspaces: at most this many tenant clients are kept, and
+# clients idle for longer than NOTION_CLIENT_IDLE_TTL seconds are dropped
+NOTION_CLIENT_REGISTRY_SIZE = int(os.getenv('NOTION_CLIENT_REGISTRY_SIZE', '256'))
+NOTION_CLIENT_IDLE_TTL = float(os.getenv('NOTION_CLIENT_IDLE_TTL', '1800'))
+# Consecutive Notion outage errors (timeouts, 5xx) that open the circuit breaker,
+# and seconds to wait before letting a probe request through
+NOTION_BREAKER_FAILURE_THRESHOLD = int(os.getenv('NOTION_BREAKER_FAILURE_THRESHOLD', '5'))
+NOTION_BREAKER_RESET_TIMEOUT = float(os.getenv('NOTION_BREAKER_RESET_TIMEOUT', '30'))
+# Send a duplicate of a slow read query after this many seconds (0 disables hedging)
+NOTION_HEDGE_DELAY = float(os.getenv('NOTION_HEDGE_DELAY', '0'))
+# Number of results requested per Notion query page (Notion allows at most 100)
+NOTION_PAGE_SIZE = int(os.getenv('NOTION_PAGE_SIZE', '100'))
+# How long (seconds) the shared active-task snapshot is served before re-querying Notion
+ACTIVE_TASKS_CACHE_TTL = float(os.getenv('ACTIVE_TASKS_CACHE_TTL', '60'))
+
+# Incremental Notion -> Postgres mirror used to serve task queries locally
+NOTION_MIRROR_ENABLED = os.getenv('NOTION_MIRROR_ENABLED', 'true').lower() == 'true'
+NOTION_MIRROR_INTERVAL = float(os.getenv('NOTION_MIRROR_INTERVAL', '60'))
+# Local data older than this (seconds) is not served; queries fall back to Notion
+NOTION_MIRROR_MAX_STALENESS = float(os.getenv('NOTION_MIRROR_MAX_STALENESS', '300'))
+# Full passes detect pages removed from Notion (seconds between passes)
+NOTION_MIRROR_FULL_SYNC_INTERVAL = float(os.getenv('NOTION_MIRROR_FULL_SYNC_INTERVAL', '21600'))
+
+# Background Notion sync for notes captured locally
+NOTE_SYNC_INTERVAL = float(os.getenv('NOTE_SYNC_INTERVAL', '30'))
+NOTE_SYNC_BATCH_SIZE = int(os.getenv('NOTE_SYNC_BATCH_SIZE', '20'))
+NOTE_SYNC_CONCURRENCY = int(os.getenv('NOTE_SYNC_CONCURRENCY', '3'))
+NOTE_SYNC_MAX_ATTEMPTS = int(os.getenv('NOTE_SYNC_MAX_ATTEMPTS', '10'))
+NOTE_SYNC_RETRY_DELAY = float(os.getenv('NOTE_SYNC_RETRY_DELAY', '15'))
+
+# Taps on note type buttons within this many seconds are merged into one write
+NOTE_TYPE_UPDATE_WINDOW = float(os.getenv('NOTE_TYPE_UPDATE_WINDOW', '2'))
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
@@ -22,10 +67,67 @@ SENTRY_DSN = os.getenv('SENTRY_DSN')
 
 # Morning Notification Configuration
 MORNING_NOTIFICATION_TIME = os.getenv('MORNING_NOTIFICATION_TIME', '08:00')
-NOTIFICATION_CHAT_IDS = os.getenv('NOTIFICATION_CHAT_IDS', '').split(',')
+# Chats that read the deployment-wide Notion database; `python -m
+# mainote_bot.import_preferences` adds them to the recipients in the database
+NOTIFICATION_CHAT_IDS = frozenset(chat_id.strip() for chat_id in os.getenv('NOTIFICATION_CHAT_IDS', '').split(',') if chat_id.strip())
+# User preferences are cached for reads; entries are replaced on every write and
+# re-read after PREFERENCES_CACHE_TTL seconds so changes made elsewhere show up
+PREFERENCES_CACHE_SIZE = int(os.getenv('PREFERENCES_CACHE_SIZE', '10000'))
+PREFERENCES_CACHE_TTL = float(os.getenv('PREFERENCES_CACHE_TTL', '300'))
 # Morning notifications can be toggled via environment variable
 # Expect values like "true"/"false" (case-insensitive)
 ENABLE_MORNING_NOTIFICATIONS = os.getenv('ENABLE_MORNING_NOTIFICATIONS', 'true').lower() == 'true'
+# Maximum number of tasks listed in a morning digest (0 means no limit)
+MORNING_DIGEST_MAX_TASKS = int(os.getenv('MORNING_DIGEST_MAX_TASKS', '0')) or None
+# Send long digests as one message with page buttons ("true") or as consecutive messages ("false")
+MORNING_DIGEST_PAGED = os.getenv('MORNING_DIGEST_PAGED', 'true').lower() == 'true'
+# Number of rendered digests (per task source and snapshot) kept for page navigation
+DIGEST_CACHE_SIZE = int(os.getenv('DIGEST_CACHE_SIZE', '2048'))
+# Per-chat digest sources fetched at once, and the time allowed to fetch a
+# batch of recipients; sources not fetched in time are not sent
+DIGEST_FETCH_CONCURRENCY = int(os.getenv('DIGEST_FETCH_CONCURRENCY', '8'))
+DIGEST_FETCH_TIMEOUT = float(os.getenv('DIGEST_FETCH_TIMEOUT', '120'))
+# Digests are fetched and rendered this many seconds before they are due, so
+# sends do not wait on Notion (0 disables staging)
+DIGEST_STAGING_LEAD = float(os.getenv('DIGEST_STAGING_LEAD', '180'))
+
+# Notification times missed by up to this many seconds (restart, deploy) are
+# caught up on startup; the delivery ledger keeps it to one digest per day
+NOTIFICATION_CATCH_UP_WINDOW = float(os.getenv('NOTIFICATION_CATCH_UP_WINDOW', '3600'))
+# Seconds before retrying a digest whose tasks could not be fetched; retries
+# stop once the catch-up window since the scheduled time has passed
+DIGEST_RETRY_DELAY = float(os.getenv('DIGEST_RETRY_DELAY', '300'))
+# Days of delivery history kept in the ledger
+NOTIFICATION_LEDGER_RETENTION_DAYS = int(os.getenv('NOTIFICATION_LEDGER_RETENTION_DAYS', '30'))
+
+# Recipients are split into this many shards; each shard is scheduled by the
+# worker holding its lease, renewed every heartbeat and taken over after the TTL
+SCHEDULER_SHARDS = int(os.getenv('SCHEDULER_SHARDS', '16'))
+SCHEDULER_LEASE_TTL = float(os.getenv('SCHEDULER_LEASE_TTL', '30'))
+SCHEDULER_HEARTBEAT_INTERVAL = float(os.getenv('SCHEDULER_HEARTBEAT_INTERVAL', '10'))
+
+# Telegram delivery of morning notifications: messages per second across all
+# chats (Bot API allows about 30), parallel sends, flood-control retries and
+# seconds between consecutive messages to the same chat
+TELEGRAM_RATE_LIMIT = float(os.getenv('TELEGRAM_RATE_LIMIT', '25'))
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv('TELEGRAM_SEND_CONCURRENCY', '20'))
+TELEGRAM_MAX_RETRIES = int(os.getenv('TELEGRAM_MAX_RETRIES', '3'))
+TELEGRAM_PER_CHAT_INTERVAL = float(os.getenv('TELEGRAM_PER_CHAT_INTERVAL', '1'))
+
+# PostgreSQL connection pool: connections kept open and at most, seconds a
+# query may run, seconds to wait for a free connection and before idle
+# connections are closed. The statement cache holds prepared statements per
+# connection; set it to 0 behind a transaction-mode pooler such as PgBouncer
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', '1'))
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', '10'))
+DATABASE_COMMAND_TIMEOUT = float(os.getenv('DATABASE_COMMAND_TIMEOUT', '60'))
+DATABASE_ACQUIRE_TIMEOUT = float(os.getenv('DATABASE_ACQUIRE_TIMEOUT', '10'))
+DATABASE_MAX_INACTIVE_LIFETIME = float(os.getenv('DATABASE_MAX_INACTIVE_LIFETIME', '300'))
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv('DATABASE_STATEMENT_CACHE_SIZE', '100'))
+# Queries slower than this many seconds are logged (0 disables the log)
+DATABASE_SLOW_QUERY_THRESHOLD = float(os.getenv('DATABASE_SLOW_QUERY_THRESHOLD', '0.5'))
+# Seconds shutdown waits for queries in flight before closing connections
+DATABASE_CLOSE_TIMEOUT = float(os.getenv('DATABASE_CLOSE_TIMEOUT', '10'))
 
 # Note Categories
 NOTE_CATEGORIES = {
@@ -41,7 +143,8 @@ NOTION_DB_SCHEMA = {
     'Status': 'select',
     'Source': 'rich_text',
     'Created': 'date',
-    'Content': 'rich_text'
+    'Content': 'rich_text',
+    'Note ID': 'rich_text'
 }
 
 # Constants
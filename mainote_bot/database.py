@@ -1,12 +1,60 @@
 import os
+import json
+import time
 import asyncio
-from asyncpg import create_pool
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from asyncpg import create_pool, connect
+from mainote_bot.config import (
+    DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE, DATABASE_COMMAND_TIMEOUT, DATABASE_ACQUIRE_TIMEOUT,
+    DATABASE_MAX_INACTIVE_LIFETIME, DATABASE_STATEMENT_CACHE_SIZE, DATABASE_SLOW_QUERY_THRESHOLD,
+    DATABASE_CLOSE_TIMEOUT
+)
 from mainote_bot.utils.logging import logger
 
 # Global pool instance
 _pool = None
 _pool_lock = asyncio.Lock()
 
+# Upper bounds (seconds) of the acquire wait histogram; the last bucket is open-ended
+ACQUIRE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Pool usage counters, reported by /health
+_pool_stats = {
+    "acquires": 0,
+    "acquire_timeouts": 0,
+    "total_wait": 0.0,
+    "max_wait": 0.0,
+    "wait_buckets": [0] * (len(ACQUIRE_WAIT_BUCKETS) + 1),
+    "slow_queries": 0
+}
+
+def get_database_url():
+    """Get the database URL from DATABASE_URL."""
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+
+    # Ensure the URL uses postgresql:// instead of postgres://
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+def observe_query(query, elapsed):
+    """Log a query that took longer than DATABASE_SLOW_QUERY_THRESHOLD."""
+    if DATABASE_SLOW_QUERY_THRESHOLD and elapsed >= DATABASE_SLOW_QUERY_THRESHOLD:
+        _pool_stats["slow_queries"] += 1
+        logger.warning(f"Slow query ({elapsed * 1000:.0f}ms): {' '.join(query.split())[:200]}")
+
+def log_query(record):
+    """Query logger attached to every pooled connection."""
+    observe_query(record.query, record.elapsed)
+
+async def init_connection(conn):
+    """Set up a new pooled connection."""
+    if DATABASE_SLOW_QUERY_THRESHOLD:
+        conn.add_query_logger(log_query)
+
 async def init_pool():
     """Initialize the database connection pool."""
     global _pool
@@ -14,21 +62,19 @@ async def init_pool():
         async with _pool_lock:
             if _pool is None:  # Double-check pattern
                 try:
-                    database_url = os.getenv('DATABASE_URL')
-                    if not database_url:
-                        raise ValueError("DATABASE_URL environment variable is not set")
-                    
-                    # Ensure the URL uses postgresql:// instead of postgres://
-                    if database_url.startswith('postgres://'):
-                        database_url = database_url.replace('postgres://', 'postgresql://', 1)
-                    
                     _pool = await create_pool(
-                        dsn=database_url,
-                        min_size=1,
-                        max_size=10,
-                        command_timeout=60
+                        dsn=get_database_url(),
+                        min_size=DATABASE_POOL_MIN_SIZE,
+                        max_size=DATABASE_POOL_MAX_SIZE,
+                        command_timeout=DATABASE_COMMAND_TIMEOUT,
+                        max_inactive_connection_lifetime=DATABASE_MAX_INACTIVE_LIFETIME,
+                        statement_cache_size=DATABASE_STATEMENT_CACHE_SIZE,
+                        init=init_connection
+                    )
+                    logger.info(
+                        f"Database connection pool initialized "
+                        f"({DATABASE_POOL_MIN_SIZE}-{DATABASE_POOL_MAX_SIZE} connections)"
                     )
-                    logger.info("Database connection pool initialized")
                 except Exception as e:
                     logger.error(f"Failed to initialize database pool: {str(e)}", exc_info=True)
                     raise
@@ -40,19 +86,74 @@ async def get_pool():
         await init_pool()
     return _pool
 
+@asynccontextmanager
+async def acquire():
+    """Acquire a pooled connection, recording how long the wait took."""
+    pool = await get_pool()
+    started = time.monotonic()
+    try:
+        conn = await pool.acquire(timeout=DATABASE_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _pool_stats["acquire_timeouts"] += 1
+        logger.warning(
+            f"Timed out after {DATABASE_ACQUIRE_TIMEOUT}s waiting for a database connection "
+            f"({pool.get_size() - pool.get_idle_size()} of {DATABASE_POOL_MAX_SIZE} in use)"
+        )
+        raise
+
+    waited = time.monotonic() - started
+    _pool_stats["acquires"] += 1
+    _pool_stats["total_wait"] += waited
+    _pool_stats["max_wait"] = max(_pool_stats["max_wait"], waited)
+    _pool_stats["wait_buckets"][bisect_left(ACQUIRE_WAIT_BUCKETS, waited)] += 1
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+def pool_stats():
+    """Connection usage, acquire wait histogram and query counters, for /health."""
+    if _pool is None:
+        return None
+    size = _pool.get_size()
+    idle = _pool.get_idle_size()
+    acquires = _pool_stats["acquires"]
+    labels = [f"<={bound * 1000:g}ms" for bound in ACQUIRE_WAIT_BUCKETS] + [f">{ACQUIRE_WAIT_BUCKETS[-1] * 1000:g}ms"]
+    return {
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+        "min_size": DATABASE_POOL_MIN_SIZE,
+        "max_size": DATABASE_POOL_MAX_SIZE,
+        "acquires": acquires,
+        "acquire_timeouts": _pool_stats["acquire_timeouts"],
+        "avg_acquire_wait_ms": round(_pool_stats["total_wait"] / acquires * 1000, 2) if acquires else 0.0,
+        "max_acquire_wait_ms": round(_pool_stats["max_wait"] * 1000, 2),
+        "acquire_wait_histogram": dict(zip(labels, _pool_stats["wait_buckets"])),
+        "slow_queries": _pool_stats["slow_queries"],
+        "slow_query_threshold_ms": round(DATABASE_SLOW_QUERY_THRESHOLD * 1000)
+    }
+
 async def close_pool():
-    """Close the database connection pool."""
+    """Close the database connection pool once queries in flight have finished."""
     global _pool
     if _pool is not None:
-        await _pool.close()
-        _pool = None
-        logger.info("Database connection pool closed")
+        pool, _pool = _pool, None
+        try:
+            await asyncio.wait_for(pool.close(), DATABASE_CLOSE_TIMEOUT)
+            logger.info("Database connection pool closed")
+        except asyncio.TimeoutError:
+            logger.warning(f"Database connections still busy after {DATABASE_CLOSE_TIMEOUT}s, terminating them")
+            pool.terminate()
+
+async def connect_listener():
+    """Open a dedicated connection for LISTEN; pooled connections would drop the subscription."""
+    return await connect(dsn=get_database_url())
 
 async def get_user_preferences(chat_id):
-    """Get user preferences from database."""
+    """Get user preferences from database ({} if the user has none, None on error)."""
     try:
-        pool = await get_pool()
-        async with pool.acquire() as conn:
+        async with acquire() as conn:
             row = await conn.fetchrow(
                 'SELECT notification_time, timezone FROM user_preferences WHERE chat_id = $1',
                 str(chat_id)
@@ -60,13 +161,12 @@ async def get_user_preferences(chat_id):
             return dict(row) if row else {}
     except Exception as e:
         logger.error(f"Error getting user preferences: {str(e)}", exc_info=True)
-        return {}
+        return None
 
 async def set_user_preferences(chat_id, preferences):
     """Set user preferences in database."""
     try:
-        pool = await get_pool()
-        async with pool.acquire() as conn:
+        async with acquire() as conn:
             await conn.execute('''
                 INSERT INTO user_preferences (chat_id, notification_time, timezone, updated_at)
                 VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
@@ -80,13 +180,636 @@ async def set_user_preferences(chat_id, preferences):
         logger.error(f"Error setting user preferences: {str(e)}", exc_info=True)
         return False
 
+async def set_user_notification_time(chat_id, notification_time):
+    """Set a user's notification time without touching their other preferences.
+
+    Returns the user's preferences after the update, or None on error.
+    """
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow('''
+                INSERT INTO user_preferences (chat_id, notification_time, updated_at)
+                VALUES ($1, $2, CURRENT_TIMESTAMP)
+                ON CONFLICT (chat_id) DO UPDATE
+                SET notification_time = EXCLUDED.notification_time,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING notification_time, timezone
+            ''', str(chat_id), notification_time)
+            return dict(row)
+    except Exception as e:
+        logger.error(f"Error setting notification time: {str(e)}", exc_info=True)
+        return None
+
+async def set_user_timezone(chat_id, timezone):
+    """Set a user's timezone without touching their other preferences.
+
+    Returns the user's preferences after the update, or None on error.
+    """
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow('''
+                INSERT INTO user_preferences (chat_id, timezone, updated_at)
+                VALUES ($1, $2, CURRENT_TIMESTAMP)
+                ON CONFLICT (chat_id) DO UPDATE
+                SET timezone = EXCLUDED.timezone,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING notification_time, timezone
+            ''', str(chat_id), timezone)
+            return dict(row)
+    except Exception as e:
+        logger.error(f"Error setting timezone: {str(e)}", exc_info=True)
+        return None
+
 async def get_all_users_with_preferences():
     """Get all users who have set preferences."""
     try:
-        pool = await get_pool()
-        async with pool.acquire() as conn:
+        async with acquire() as conn:
             rows = await conn.fetch('SELECT chat_id FROM user_preferences')
             return [row['chat_id'] for row in rows]
     except Exception as e:
         logger.error(f"Error getting all users with preferences: {str(e)}", exc_info=True)
-        return [] 
\ No newline at end of file
+        return [] 
+
+async def get_all_notification_preferences():
+    """Get (chat_id, notification_time, timezone) of every user in one query.
+
+    Returns None if the query failed.
+    """
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('SELECT chat_id, notification_time, timezone FROM user_preferences')
+            return [tuple(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting notification preferences: {str(e)}", exc_info=True)
+        return None
+
+async def import_user_preferences(records, overwrite=False):
+    """Bulk load preferences with COPY in one transaction.
+
+    ``records`` yields (chat_id, notification_time, timezone, priority) and is
+    streamed into a temporary table, then merged into user_preferences. A chat
+    listed more than once takes its lowest-priority record. Existing rows are
+    kept unless ``overwrite``, in which case non-null imported values replace
+    theirs. Schedulers get one RELOAD notification instead of one per row.
+    Returns (copied, imported) row counts, or None on error.
+    """
+    if overwrite:
+        on_conflict = '''UPDATE
+                        SET notification_time = COALESCE(EXCLUDED.notification_time, user_preferences.notification_time),
+                            timezone = COALESCE(EXCLUDED.timezone, user_preferences.timezone)
+                        WHERE (user_preferences.notification_time, user_preferences.timezone) IS DISTINCT FROM
+                              (COALESCE(EXCLUDED.notification_time, user_preferences.notification_time),
+                               COALESCE(EXCLUDED.timezone, user_preferences.timezone))'''
+    else:
+        on_conflict = 'NOTHING'
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                # Silences the per-row triggers for this transaction only
+                await conn.execute("SET LOCAL mainote.bulk_import = 'on'")
+                await conn.execute('''
+                    CREATE TEMP TABLE preferences_import (
+                        chat_id TEXT NOT NULL,
+                        notification_time TEXT,
+                        timezone TEXT,
+                        priority INTEGER NOT NULL
+                    ) ON COMMIT DROP
+                ''')
+                result = await conn.copy_records_to_table('preferences_import', records=records)
+                copied = int(result.split()[-1])
+                result = await conn.execute(f'''
+                    INSERT INTO user_preferences (chat_id, notification_time, timezone)
+                    SELECT DISTINCT ON (chat_id) chat_id, notification_time, timezone
+                    FROM preferences_import
+                    ORDER BY chat_id, priority
+                    ON CONFLICT (chat_id) DO {on_conflict}
+                ''')
+                imported = int(result.split()[-1])
+                if imported:
+                    await conn.execute(
+                        "SELECT pg_notify('scheduler_changes', $1)",
+                        json.dumps({"table": "user_preferences", "op": "RELOAD"})
+                    )
+                return copied, imported
+    except Exception as e:
+        logger.error(f"Error importing user preferences: {str(e)}", exc_info=True)
+        return None
+
+async def get_blocked_chats():
+    """Get the IDs of chats that blocked the bot. Returns None if the query failed."""
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('SELECT chat_id FROM blocked_chats')
+            return {row['chat_id'] for row in rows}
+    except Exception as e:
+        logger.error(f"Error getting blocked chats: {str(e)}", exc_info=True)
+        return None
+
+async def set_chat_blocked(chat_id, reason):
+    """Record that a chat blocked the bot."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                INSERT INTO blocked_chats (chat_id, reason)
+                VALUES ($1, $2)
+                ON CONFLICT (chat_id) DO NOTHING
+            ''', str(chat_id), reason)
+            return True
+    except Exception as e:
+        logger.error(f"Error marking chat as blocked: {str(e)}", exc_info=True)
+        return False
+
+async def delete_chat_blocked(chat_id):
+    """Forget that a chat blocked the bot."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('DELETE FROM blocked_chats WHERE chat_id = $1', str(chat_id))
+            return True
+    except Exception as e:
+        logger.error(f"Error unblocking chat: {str(e)}", exc_info=True)
+        return False
+
+async def claim_notification_deliveries(deliveries):
+    """Claim morning digests before sending them.
+
+    ``deliveries`` is a list of (chat_id, local_date, scheduled_at) tuples.
+    Each chat can be claimed once per local date, by any worker, so only the
+    returned chat IDs may be sent to. Returns None if the claim failed.
+    """
+    if not deliveries:
+        return set()
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                INSERT INTO notification_deliveries (chat_id, local_date, scheduled_at)
+                SELECT * FROM unnest($1::text[], $2::date[], $3::timestamptz[])
+                ON CONFLICT (chat_id, local_date) DO NOTHING
+                RETURNING chat_id
+            ''', *(list(column) for column in zip(*deliveries)))
+            return {row['chat_id'] for row in rows}
+    except Exception as e:
+        logger.error(f"Error claiming notification deliveries: {str(e)}", exc_info=True)
+        return None
+
+async def record_notification_deliveries(results):
+    """Store the outcome of claimed digests.
+
+    ``results`` is a list of (chat_id, local_date, status, error) tuples.
+    """
+    if not results:
+        return
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                UPDATE notification_deliveries AS d
+                SET status = r.status,
+                    error = r.error,
+                    delivered_at = CASE WHEN r.status = 'sent' THEN CURRENT_TIMESTAMP END
+                FROM unnest($1::text[], $2::date[], $3::text[], $4::text[]) AS r(chat_id, local_date, status, error)
+                WHERE d.chat_id = r.chat_id AND d.local_date = r.local_date
+            ''', *(list(column) for column in zip(*results)))
+    except Exception as e:
+        logger.error(f"Error recording notification deliveries: {str(e)}", exc_info=True)
+
+async def release_notification_deliveries(deliveries):
+    """Drop claims of digests that were never sent, so they can be claimed again.
+
+    ``deliveries`` is a list of (chat_id, local_date) tuples; only rows still
+    in the claimed state are removed.
+    """
+    if not deliveries:
+        return
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                DELETE FROM notification_deliveries AS d
+                USING unnest($1::text[], $2::date[]) AS r(chat_id, local_date)
+                WHERE d.chat_id = r.chat_id AND d.local_date = r.local_date AND d.status = 'claimed'
+            ''', *(list(column) for column in zip(*deliveries)))
+    except Exception as e:
+        logger.error(f"Error releasing notification deliveries: {str(e)}", exc_info=True)
+
+async def prune_notification_deliveries(keep_days):
+    """Delete ledger entries older than ``keep_days`` days."""
+    try:
+        async with acquire() as conn:
+            await conn.execute(
+                'DELETE FROM notification_deliveries WHERE local_date < CURRENT_DATE - $1::int',
+                keep_days
+            )
+    except Exception as e:
+        logger.error(f"Error pruning notification deliveries: {str(e)}", exc_info=True)
+
+async def register_scheduler_shards(shard_count):
+    """Create the lease rows for every scheduler shard and forget long-dead workers."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                INSERT INTO scheduler_shards (shard)
+                SELECT generate_series(0, $1 - 1)
+                ON CONFLICT (shard) DO NOTHING
+            ''', shard_count)
+            await conn.execute(
+                "DELETE FROM scheduler_workers WHERE heartbeat_at < CURRENT_TIMESTAMP - INTERVAL '1 day'"
+            )
+            return True
+    except Exception as e:
+        logger.error(f"Error registering scheduler shards: {str(e)}", exc_info=True)
+        return False
+
+async def heartbeat_scheduler_worker(worker_id, ttl):
+    """Record that a worker is alive. Returns the number of live workers (including it), or None."""
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval('''
+                WITH beat AS (
+                    INSERT INTO scheduler_workers (worker_id)
+                    VALUES ($1)
+                    ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = CURRENT_TIMESTAMP
+                )
+                SELECT count(*) + 1 FROM scheduler_workers
+                WHERE worker_id <> $1 AND heartbeat_at > CURRENT_TIMESTAMP - make_interval(secs => $2)
+            ''', worker_id, float(ttl))
+    except Exception as e:
+        logger.error(f"Error sending scheduler heartbeat: {str(e)}", exc_info=True)
+        return None
+
+async def remove_scheduler_worker(worker_id):
+    """Forget a worker that is shutting down."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('DELETE FROM scheduler_workers WHERE worker_id = $1', worker_id)
+    except Exception as e:
+        logger.error(f"Error removing scheduler worker: {str(e)}", exc_info=True)
+
+async def renew_shard_leases(worker_id, shards, ttl):
+    """Extend a worker's shard leases. Returns the shards it still holds, or None on error."""
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE scheduler_shards
+                SET lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $3)
+                WHERE owner = $1 AND shard = ANY($2::int[])
+                RETURNING shard
+            ''', worker_id, list(shards), float(ttl))
+            return {row['shard'] for row in rows}
+    except Exception as e:
+        logger.error(f"Error renewing scheduler shard leases: {str(e)}", exc_info=True)
+        return None
+
+async def acquire_shard_leases(worker_id, shard_count, limit, ttl):
+    """Lease up to ``limit`` free or expired shards. Returns the acquired shards, or None on error."""
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE scheduler_shards
+                SET owner = $1,
+                    lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $4),
+                    acquired_at = CURRENT_TIMESTAMP
+                WHERE shard IN (
+                    SELECT shard FROM scheduler_shards
+                    WHERE shard < $2
+                      AND (owner IS NULL OR lease_expires_at IS NULL OR lease_expires_at < CURRENT_TIMESTAMP)
+                    ORDER BY shard
+                    LIMIT $3
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING shard
+            ''', worker_id, shard_count, limit, float(ttl))
+            return {row['shard'] for row in rows}
+    except Exception as e:
+        logger.error(f"Error acquiring scheduler shard leases: {str(e)}", exc_info=True)
+        return None
+
+async def release_shard_leases(worker_id, shards):
+    """Give up a worker's leases so other workers can take the shards at once."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                UPDATE scheduler_shards SET owner = NULL, lease_expires_at = NULL
+                WHERE owner = $1 AND shard = ANY($2::int[])
+            ''', worker_id, list(shards))
+            return True
+    except Exception as e:
+        logger.error(f"Error releasing scheduler shard leases: {str(e)}", exc_info=True)
+        return False
+
+async def insert_note(chat_id, content, title=None, category='task', source='telegram-text', metadata=None):
+    """Store a note locally and queue it for Notion sync. Returns the note UUID."""
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval('''
+                INSERT INTO notes (chat_id, content, title, category, status, source, metadata, sync_state, next_sync_at)
+                VALUES ($1, $2, $3, $4, 'active', $5, $6::jsonb, 'pending', CURRENT_TIMESTAMP)
+                RETURNING uuid_id
+            ''', str(chat_id), content, title, category, source, json.dumps(metadata) if metadata else None)
+    except Exception as e:
+        logger.error(f"Error inserting note: {str(e)}", exc_info=True)
+        return None
+
+async def set_note_category(note_id, category):
+    """Update the category of a local note. Returns the updated row or None."""
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow('''
+                UPDATE notes SET category = $2
+                WHERE uuid_id = $1::uuid
+                RETURNING uuid_id, chat_id, notion_page_id, category, sync_state
+            ''', str(note_id), category)
+            return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Error updating category for note {note_id}: {str(e)}", exc_info=True)
+        return None
+
+async def claim_notes_for_sync(batch_size, lease_seconds):
+    """Claim a batch of pending notes for a Notion push.
+
+    Claimed rows have next_sync_at pushed forward by the lease, so other
+    workers skip them until the lease expires or the push is recorded.
+    """
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE notes SET next_sync_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+                WHERE id IN (
+                    SELECT id FROM notes
+                    WHERE sync_state = 'pending'
+                      AND (next_sync_at IS NULL OR next_sync_at <= CURRENT_TIMESTAMP)
+                    ORDER BY created_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING uuid_id, chat_id, content, title, category, source, sync_attempts
+            ''', batch_size, float(lease_seconds))
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error claiming notes for sync: {str(e)}", exc_info=True)
+        return []
+
+async def mark_notes_synced(synced):
+    """Backfill Notion page IDs for pushed notes.
+
+    ``synced`` is a list of (note_uuid, notion_page_id, notion_database_id)
+    tuples. A mirror pass running during the push may already have stored a
+    page as its own row; that row is merged into the note in the same
+    transaction, so the unique page ID never blocks the write-back. Returns
+    the updated rows so callers can detect category changes made during the push.
+    """
+    if not synced:
+        return []
+    note_ids = [str(note_id) for note_id, _, _ in synced]
+    page_ids = [page_id for _, page_id, _ in synced]
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                mirrored = await conn.fetch('''
+                    DELETE FROM notes AS m
+                    USING unnest($1::uuid[], $2::text[]) AS s(uuid_id, page_id)
+                    WHERE m.notion_page_id = s.page_id
+                      AND m.uuid_id <> s.uuid_id
+                      AND m.source = 'notion'
+                    RETURNING m.notion_page_id, m.notion_last_edited_at
+                ''', note_ids, page_ids)
+                last_edited = {row['notion_page_id']: row['notion_last_edited_at'] for row in mirrored}
+                if mirrored:
+                    logger.info(f"Merged {len(mirrored)} mirrored Notion pages into their local notes")
+
+                rows = await conn.fetch('''
+                    UPDATE notes AS n
+                    SET notion_page_id = s.page_id,
+                        notion_database_id = s.database_id,
+                        notion_last_edited_at = COALESCE(s.last_edited_at, n.notion_last_edited_at),
+                        sync_state = 'synced',
+                        next_sync_at = NULL,
+                        last_sync_error = NULL
+                    FROM unnest($1::uuid[], $2::text[], $3::text[], $4::timestamptz[])
+                        AS s(uuid_id, page_id, database_id, last_edited_at)
+                    WHERE n.uuid_id = s.uuid_id
+                    RETURNING n.uuid_id, n.chat_id, n.notion_page_id, n.category
+                ''', note_ids, page_ids,
+                    [database_id for _, _, database_id in synced],
+                    [last_edited.get(page_id) for page_id in page_ids])
+                return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error marking notes as synced: {str(e)}", exc_info=True)
+        return []
+
+async def mark_note_sync_failed(note_id, error, retry_delay, give_up):
+    """Record a failed Notion push and schedule the next retry."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                UPDATE notes
+                SET sync_attempts = sync_attempts + 1,
+                    last_sync_error = $2,
+                    sync_state = CASE WHEN $4 THEN 'failed' ELSE 'pending' END,
+                    next_sync_at = CURRENT_TIMESTAMP + make_interval(secs => $3)
+                WHERE uuid_id = $1::uuid
+            ''', str(note_id), error[:1000], float(retry_delay), give_up)
+            return True
+    except Exception as e:
+        logger.error(f"Error recording sync failure for note {note_id}: {str(e)}", exc_info=True)
+        return False
+
+async def get_active_chat_notes(chat_ids, limit=None):
+    """Get the active notes of many chats in one query, newest first.
+
+    Returns chat_id -> rows shaped like mirrored notes (unsynced notes use
+    their UUID and content), or None on error.
+    """
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT chat_id, notion_page_id, title, category, status, notion_last_edited_at
+                FROM (
+                    SELECT chat_id,
+                           COALESCE(notion_page_id, uuid_id::text) AS notion_page_id,
+                           COALESCE(title, left(content, 50)) AS title,
+                           category, status,
+                           COALESCE(notion_last_edited_at, updated_at) AS notion_last_edited_at,
+                           row_number() OVER (PARTITION BY chat_id ORDER BY created_at DESC) AS position
+                    FROM notes
+                    WHERE chat_id = ANY($1::text[]) AND status = 'active'
+                ) AS n
+                WHERE $2::int IS NULL OR position <= $2
+                ORDER BY chat_id, position
+            ''', [str(chat_id) for chat_id in chat_ids], limit)
+            notes = {str(chat_id): [] for chat_id in chat_ids}
+            for row in rows:
+                notes[row['chat_id']].append(dict(row))
+            return notes
+    except Exception as e:
+        logger.error(f"Error querying active notes of {len(chat_ids)} chats: {str(e)}", exc_info=True)
+        return None
+
+async def get_notion_sync_cursor(database_id):
+    """Get the mirror cursor for a Notion database."""
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                'SELECT last_edited_time, last_synced_at, last_full_sync_at FROM notion_sync_cursors WHERE database_id = $1',
+                database_id
+            )
+            return dict(row) if row else {}
+    except Exception as e:
+        logger.error(f"Error getting Notion sync cursor: {str(e)}", exc_info=True)
+        return None
+
+async def upsert_mirrored_pages(database_id, pages, last_edited_time, full_sync=False):
+    """Upsert mirrored Notion pages and advance the sync cursor in one transaction.
+
+    ``pages`` is a list of dicts with page_id, title, content, category,
+    status, last_edited_time and note_id. A page carrying the UUID of a local
+    note that has no page yet (its push is in flight, or failed after Notion
+    created the page) is linked to that note instead of getting a row of its
+    own; the note keeps its local fields, so a type picked during the push is
+    still sent by the note sync. On a full sync, pages of the database that
+    were not seen are marked deleted. Returns the number of changed rows.
+    """
+    async with acquire() as conn:
+        async with conn.transaction():
+            linked = await conn.fetch('''
+                UPDATE notes AS n
+                SET notion_page_id = s.page_id,
+                    notion_database_id = $1,
+                    notion_last_edited_at = s.last_edited_time,
+                    sync_state = 'synced',
+                    next_sync_at = NULL,
+                    last_sync_error = NULL
+                FROM unnest($2::text[], $3::uuid[], $4::timestamptz[]) AS s(page_id, note_id, last_edited_time)
+                WHERE n.uuid_id = s.note_id
+                  AND n.notion_page_id IS NULL
+                  AND NOT EXISTS (SELECT 1 FROM notes e WHERE e.notion_page_id = s.page_id)
+                RETURNING n.notion_page_id
+            ''', database_id,
+                [page['page_id'] for page in pages],
+                [page['note_id'] for page in pages],
+                [page['last_edited_time'] for page in pages])
+            changed = len(linked)
+            linked_pages = {row['notion_page_id'] for row in linked}
+            pages_to_upsert = [page for page in pages if page['page_id'] not in linked_pages]
+
+            result = await conn.execute('''
+                INSERT INTO notes (chat_id, content, title, category, status, source,
+                                   notion_page_id, notion_database_id, notion_last_edited_at, sync_state)
+                SELECT '', s.content, s.title, s.category, s.status, 'notion',
+                       s.page_id, $1, s.last_edited_time, 'synced'
+                FROM unnest($2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::timestamptz[])
+                    AS s(page_id, title, content, category, status, last_edited_time)
+                ON CONFLICT (notion_page_id) WHERE notion_page_id IS NOT NULL DO UPDATE
+                SET title = EXCLUDED.title,
+                    content = EXCLUDED.content,
+                    category = EXCLUDED.category,
+                    status = EXCLUDED.status,
+                    notion_database_id = EXCLUDED.notion_database_id,
+                    notion_last_edited_at = EXCLUDED.notion_last_edited_at
+                WHERE (notes.notion_last_edited_at IS NULL
+                       OR notes.notion_last_edited_at <= EXCLUDED.notion_last_edited_at)
+                  AND (notes.title, notes.content, notes.category, notes.status, notes.notion_database_id)
+                      IS DISTINCT FROM
+                      (EXCLUDED.title, EXCLUDED.content, EXCLUDED.category, EXCLUDED.status, EXCLUDED.notion_database_id)
+            ''', database_id,
+                [page['page_id'] for page in pages_to_upsert],
+                [page['title'] for page in pages_to_upsert],
+                [page['content'] for page in pages_to_upsert],
+                [page['category'] for page in pages_to_upsert],
+                [page['status'] for page in pages_to_upsert],
+                [page['last_edited_time'] for page in pages_to_upsert])
+            changed += int(result.split()[-1])
+
+            if full_sync:
+                result = await conn.execute('''
+                    UPDATE notes SET status = 'deleted'
+                    WHERE notion_database_id = $1
+                      AND notion_page_id IS NOT NULL
+                      AND status <> 'deleted'
+                      AND NOT (notion_page_id = ANY($2::text[]))
+                ''', database_id, [page['page_id'] for page in pages])
+                changed += int(result.split()[-1])
+
+            await conn.execute('''
+                INSERT INTO notion_sync_cursors (database_id, last_edited_time, last_synced_at, last_full_sync_at)
+                VALUES ($1, $2, CURRENT_TIMESTAMP, CASE WHEN $3 THEN CURRENT_TIMESTAMP END)
+                ON CONFLICT (database_id) DO UPDATE
+                SET last_edited_time = GREATEST(notion_sync_cursors.last_edited_time, EXCLUDED.last_edited_time),
+                    last_synced_at = CURRENT_TIMESTAMP,
+                    last_full_sync_at = COALESCE(EXCLUDED.last_full_sync_at, notion_sync_cursors.last_full_sync_at)
+            ''', database_id, last_edited_time, full_sync)
+            return changed
+
+async def get_mirrored_active_notes(database_id, max_staleness):
+    """Get active notes of a mirrored Notion database.
+
+    Returns None when the mirror has not completed a pass within
+    ``max_staleness`` seconds, so callers can fall back to Notion.
+    """
+    try:
+        async with acquire() as conn:
+            fresh = await conn.fetchval('''
+                SELECT last_synced_at > CURRENT_TIMESTAMP - make_interval(secs => $2)
+                FROM notion_sync_cursors WHERE database_id = $1
+            ''', database_id, float(max_staleness))
+            if not fresh:
+                return None
+            rows = await conn.fetch('''
+                SELECT notion_page_id, title, category, status, notion_last_edited_at
+                FROM notes
+                WHERE notion_database_id = $1 AND status = 'active' AND notion_page_id IS NOT NULL
+                ORDER BY created_at DESC
+            ''', database_id)
+            return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error querying mirrored notes: {str(e)}", exc_info=True)
+        return None
+
+async def get_notion_workspace(chat_id):
+    """Get the Notion credentials configured for a chat."""
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                'SELECT api_key, database_id FROM notion_workspaces WHERE chat_id = $1',
+                str(chat_id)
+            )
+            return dict(row) if row else {}
+    except Exception as e:
+        logger.error(f"Error getting Notion workspace: {str(e)}", exc_info=True)
+        return None
+
+async def get_notion_workspaces(chat_ids):
+    """Get the Notion credentials of many chats. Returns chat_id -> row for chats that have them, or None."""
+    try:
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                'SELECT chat_id, api_key, database_id FROM notion_workspaces WHERE chat_id = ANY($1::text[])',
+                [str(chat_id) for chat_id in chat_ids]
+            )
+            return {row['chat_id']: dict(row) for row in rows}
+    except Exception as e:
+        logger.error(f"Error getting Notion workspaces: {str(e)}", exc_info=True)
+        return None
+
+async def set_notion_workspace(chat_id, api_key, database_id):
+    """Store the Notion credentials for a chat."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('''
+                INSERT INTO notion_workspaces (chat_id, api_key, database_id)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (chat_id) DO UPDATE
+                SET api_key = $2,
+                    database_id = $3
+            ''', str(chat_id), api_key, database_id)
+            return True
+    except Exception as e:
+        logger.error(f"Error setting Notion workspace: {str(e)}", exc_info=True)
+        return False
+
+async def delete_notion_workspace(chat_id):
+    """Remove the Notion credentials for a chat."""
+    try:
+        async with acquire() as conn:
+            await conn.execute('DELETE FROM notion_workspaces WHERE chat_id = $1', str(chat_id))
+            return True
+    except Exception as e:
+        logger.error(f"Error deleting Notion workspace: {str(e)}", exc_info=True)
+        return False
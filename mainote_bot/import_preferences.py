@@ -0,0 +1,90 @@
+"""Import legacy notification recipients into the user_preferences table.
+
+Before preferences moved to PostgreSQL they were kept in user_preferences.json,
+and default recipients were listed in NOTIFICATION_CHAT_IDS. The scheduler
+only reads the database, so both are loaded with COPY in one transaction:
+
+    python -m mainote_bot.import_preferences --file user_preferences.json
+
+Chats from the JSON file keep their own settings; chats only listed in
+NOTIFICATION_CHAT_IDS get MORNING_NOTIFICATION_TIME in UTC. Existing rows are
+left alone unless --overwrite is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pytz
+from mainote_bot.config import NOTIFICATION_CHAT_IDS, MORNING_NOTIFICATION_TIME
+from mainote_bot.utils.logging import logger
+from mainote_bot.database import import_user_preferences, close_pool
+
+# File the bot stored user preferences in before the database
+LEGACY_PREFERENCES_FILE = "user_preferences.json"
+
+# Lower priority wins when a chat is listed by both sources
+PRIORITY_JSON = 0
+PRIORITY_ENV = 1
+
+def valid_time(value):
+    """Whether a value is an HH:MM time."""
+    try:
+        hour, minute = map(int, value.split(':'))
+        return 0 <= hour < 24 and 0 <= minute < 60
+    except (AttributeError, ValueError):
+        return False
+
+def iter_json_records(path, skipped):
+    """Yield import records from a legacy ``{chat_id: {notification_time, timezone}}`` file.
+
+    Entries with an invalid time or timezone are counted in ``skipped`` and left out.
+    """
+    if not os.path.exists(path):
+        logger.info(f"No legacy preferences file at {path}")
+        return
+    with open(path, 'r') as f:
+        preferences = json.load(f)
+
+    for chat_id, entry in preferences.items():
+        entry = entry if isinstance(entry, dict) else {}
+        notification_time = entry.get('notification_time')
+        timezone = entry.get('timezone')
+        if (notification_time and not valid_time(notification_time)) or (timezone and (not isinstance(timezone, str) or timezone not in pytz.all_timezones_set)):
+            logger.warning(f"Skipping legacy preferences of chat ID {chat_id}: {entry}")
+            skipped.append(chat_id)
+            continue
+        yield str(chat_id).strip(), notification_time or None, timezone or None, PRIORITY_JSON
+
+def iter_env_records():
+    """Yield import records for the chats configured in NOTIFICATION_CHAT_IDS."""
+    for chat_id in NOTIFICATION_CHAT_IDS:
+        yield chat_id, MORNING_NOTIFICATION_TIME, None, PRIORITY_ENV
+
+async def run(path, include_env, overwrite):
+    skipped = []
+
+    def records():
+        yield from iter_json_records(path, skipped)
+        if include_env:
+            yield from iter_env_records()
+
+    try:
+        result = await import_user_preferences(records(), overwrite=overwrite)
+    finally:
+        await close_pool()
+    if result is None:
+        raise SystemExit("Import failed, nothing was changed")
+    copied, imported = result
+    print(f"Read {copied} records ({len(skipped)} invalid skipped), "
+          f"{'imported or updated' if overwrite else 'imported'} {imported} chats")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=LEGACY_PREFERENCES_FILE, help="legacy preferences JSON file")
+    parser.add_argument("--no-env", action="store_true", help="do not import NOTIFICATION_CHAT_IDS")
+    parser.add_argument("--overwrite", action="store_true", help="replace settings of chats already in the database")
+    args = parser.parse_args()
+    asyncio.run(run(args.file, not args.no_env, args.overwrite))
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
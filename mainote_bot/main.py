@@ -2,15 +2,20 @@ import sys
 from telegram import Bot
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from fastapi import FastAPI
-from mainote_bot.config import TELEGRAM_BOT_TOKEN, NOTION_API_KEY
+from mainote_bot.config import TELEGRAM_BOT_TOKEN, NOTION_API_KEY, NOTION_MIRROR_ENABLED
 from mainote_bot.utils.logging import logger
-from mainote_bot.bot.commands import start_command, help_command, morning_command, settime_command, settimezone_command
+from mainote_bot.bot.commands import start_command, help_command, morning_command, settime_command, settimezone_command, setnotion_command
 from mainote_bot.bot.messages import handle_message
 from mainote_bot.bot.callbacks import button_callback
-from mainote_bot.scheduler.notifications import start_scheduler
+from mainote_bot.scheduler.notifications import start_scheduler, stop_scheduler
 from mainote_bot.webhook.setup import setup_webhook
 from mainote_bot.webhook.routes import create_app
-from mainote_bot.database import init_pool
+from mainote_bot.database import init_pool, close_pool
+from mainote_bot.notion.client import close_notion_client
+from mainote_bot.notion.sync import start_note_sync, stop_note_sync
+from mainote_bot.bot.type_updates import flush_note_type_changes
+from mainote_bot.notion.mirror import start_notion_mirror, stop_notion_mirror
+from mainote_bot.notion.schema import load_database_schema
 
 # Create FastAPI app
 app = FastAPI()
@@ -31,6 +36,7 @@ async def initialize_bot():
         application.add_handler(CommandHandler("morning", morning_command))
         application.add_handler(CommandHandler("settime", settime_command))
         application.add_handler(CommandHandler("settimezone", settimezone_command))
+        application.add_handler(CommandHandler("setnotion", setnotion_command))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
         application.add_handler(CallbackQueryHandler(button_callback))
 
@@ -61,9 +67,19 @@ async def startup_event():
     if not await setup_webhook(bot):
         logger.error("Failed to set up webhook, but continuing anyway...")
 
+    # Check the Notion database layout and cache its property IDs
+    await load_database_schema()
+
     # Start the scheduler
     start_scheduler()
 
+    # Start pushing locally captured notes to Notion
+    start_note_sync()
+
+    # Keep the local Notion mirror up to date for task queries
+    if NOTION_MIRROR_ENABLED:
+        start_notion_mirror()
+
     # Store bot and application in app state
     app.state.bot = bot
     app.state.application = application
@@ -71,10 +87,21 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
+    await stop_scheduler()
+    await flush_note_type_changes()
+    await stop_note_sync()
+    await stop_notion_mirror()
+
     if hasattr(app.state, 'application'):
         await app.state.application.stop()
         await app.state.application.shutdown()
 
+    # Release pooled Notion connections
+    await close_notion_client()
+
+    # Close database connections last, once everything above has stopped using them
+    await close_pool()
+
 # Include webhook routes
 app.include_router(create_app(None, None))
 
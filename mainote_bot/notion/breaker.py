@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+from mainote_bot.utils.logging import logger
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Notion while the circuit breaker is open."""
+
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"{name} circuit is open, retrying in {retry_after:.0f}s")
+
+def is_outage_error(error):
+    """Whether a failed request points at Notion being down rather than a bad request."""
+    if isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+        return True
+    return isinstance(error, HTTPResponseError) and error.status >= 500
+
+class CircuitBreaker:
+    """Stops calling a failing service until it has had time to recover.
+
+    After ``failure_threshold`` consecutive outage errors the circuit opens and
+    requests fail immediately with CircuitOpenError. Once ``reset_timeout``
+    seconds have passed a single probe request is let through (half-open):
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.transitions = deque(maxlen=10)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"{self.name} circuit breaker: {self.state} -> {state}")
+        self.state = state
+        self.transitions.append({
+            "state": state,
+            "at": datetime.now(timezone.utc).isoformat()
+        })
+
+    def _retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self):
+        """Whether requests are currently rejected without a probe being due."""
+        if self.state == STATE_OPEN:
+            return self._retry_after() > 0
+        return self.state == STATE_HALF_OPEN and self._probing
+
+    def before_request(self):
+        """Let a request through or raise CircuitOpenError."""
+        if self.state == STATE_OPEN and self._retry_after() <= 0:
+            self._set_state(STATE_HALF_OPEN)
+        if self.state == STATE_CLOSED:
+            return
+        if self.state == STATE_HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name, max(self._retry_after(), 1.0))
+
+    def record_success(self):
+        """Record a request that reached the service."""
+        self._failures = 0
+        self._probing = False
+        self._set_state(STATE_CLOSED)
+
+    def record_failure(self):
+        """Record a request that failed because of the service."""
+        self._failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(STATE_OPEN)
+
+    def release(self):
+        """Forget a request that was cancelled before it completed."""
+        self._probing = False
+
+    def stats(self):
+        """Return the breaker state and recent transitions for monitoring."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "rejected_requests": self.rejected,
+            "retry_in_seconds": round(self._retry_after(), 1) if self.state == STATE_OPEN else None,
+            "transitions": list(self.transitions)
+        }
+
+# Counters for hedged requests
+hedge_stats = {"requests": 0, "hedged": 0, "hedge_won": 0}
+
+async def hedged(make_call, delay):
+    """Run an idempotent call, starting a duplicate if it takes longer than ``delay``.
+
+    Whichever attempt succeeds first wins and the other one is cancelled. The
+    error of the first attempt is raised only if both fail.
+    """
+    hedge_stats["requests"] += 1
+    first = asyncio.ensure_future(make_call())
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if first in done:
+            return first.result()
+
+        hedge_stats["hedged"] += 1
+        second = asyncio.ensure_future(make_call())
+        pending.add(second)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    if attempt is second:
+                        hedge_stats["hedge_won"] += 1
+                    return attempt.result()
+        # Both attempts failed: report the original error
+        second.exception()
+        return first.result()
+    finally:
+        for attempt in pending:
+            attempt.cancel()
\ No newline at end of file
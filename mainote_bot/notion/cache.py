@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import namedtuple
+from mainote_bot.utils.logging import logger
+
+# Immutable view of a cached result; version increases with every refresh
+Snapshot = namedtuple('Snapshot', ['version', 'data', 'fetched_at'])
+
+class SnapshotCache:
+    """Process-wide TTL cache for a single expensive query result.
+
+    Concurrent callers that miss the cache share one in-flight load instead of
+    issuing identical requests. ``invalidate()`` drops the cached value and
+    discards the result of any load that was already running, so writes are
+    never hidden behind a stale snapshot. With ``serve_stale`` a failed load
+    returns the last successfully loaded snapshot instead of raising.
+    """
+
+    def __init__(self, name, loader, ttl, serve_stale=False):
+        self.name = name
+        self.ttl = ttl
+        self.serve_stale = serve_stale
+        self._loader = loader
+        self._snapshot = None
+        self._last_good = None
+        self._inflight = None
+        self._generation = 0
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.stale_served = 0
+
+    def is_fresh(self):
+        """Whether a snapshot is cached and within its TTL, so reading it needs no load."""
+        return (
+            self._snapshot is not None and
+            time.monotonic() - self._snapshot.fetched_at < self.ttl
+        )
+
+    async def _load(self, generation):
+        try:
+            data = await self._loader()
+        except Exception as e:
+            if not self.serve_stale or self._last_good is None:
+                raise
+            self.stale_served += 1
+            logger.warning(f"Serving stale {self.name} snapshot {self._last_good.version}: {str(e)}")
+            return self._last_good
+        # Every completed load takes a new version, published or not, so a
+        # discarded result never shares a version with later data
+        self._version += 1
+        snapshot = Snapshot(self._version, data, time.monotonic())
+        # Only publish if nothing invalidated the cache while we were loading
+        if generation == self._generation:
+            self._snapshot = snapshot
+            self._last_good = snapshot
+        return snapshot
+
+    async def get_snapshot(self):
+        """Return a fresh snapshot, loading it at most once across concurrent callers."""
+        if self.is_fresh():
+            self.hits += 1
+            return self._snapshot
+
+        if self._inflight is not None and not self._inflight.done():
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight)
+
+        self.misses += 1
+        self._inflight = asyncio.ensure_future(self._load(self._generation))
+        try:
+            return await asyncio.shield(self._inflight)
+        finally:
+            if self._inflight is not None and self._inflight.done():
+                self._inflight = None
+
+    def is_current(self, version):
+        """Whether ``version`` is the latest snapshot and nothing has invalidated it (it may be past its TTL)."""
+        return self._snapshot is not None and self._snapshot.version == version
+
+    async def get(self):
+        """Return the cached data, loading it if necessary."""
+        return (await self.get_snapshot()).data
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next read goes to the source."""
+        self._generation += 1
+        self._snapshot = None
+        self._inflight = None
+        self.invalidations += 1
+        logger.info(f"Invalidated {self.name} cache")
+
+    def stats(self):
+        """Return hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "stale_served": self.stale_served,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+            "version": self._version,
+            "age_seconds": round(time.monotonic() - self._snapshot.fetched_at, 1) if self._snapshot else None
+        }
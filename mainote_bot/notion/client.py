@@ -1,11 +1,112 @@
-from notion_client import Client
-from mainote_bot.config import NOTION_API_KEY
+import asyncio
+import httpx
+from notion_client import AsyncClient
+from notion_client.errors import HTTPResponseError
+from mainote_bot.config import (
+    NOTION_API_KEY, NOTION_MAX_CONNECTIONS, NOTION_MAX_KEEPALIVE_CONNECTIONS,
+    NOTION_KEEPALIVE_EXPIRY, NOTION_CONNECT_TIMEOUT, NOTION_REQUEST_TIMEOUT,
+    NOTION_POOL_TIMEOUT, NOTION_RATE_LIMIT, NOTION_RATE_BURST, NOTION_MAX_RETRIES,
+    NOTION_CLIENT_REGISTRY_SIZE, NOTION_CLIENT_IDLE_TTL, NOTION_BREAKER_FAILURE_THRESHOLD,
+    NOTION_BREAKER_RESET_TIMEOUT
+)
+from mainote_bot.notion.governor import RequestGovernor
+from mainote_bot.notion.breaker import CircuitBreaker, is_outage_error
 from mainote_bot.utils.logging import logger
+from mainote_bot.utils.lru import LRUCache, MISSING
 
-def create_notion_client():
-    """Create and return a Notion client instance."""
+# Shared keep-alive connection pool used by every Notion client in the process
+_transport = None
+
+def get_transport():
+    """Get the shared HTTP transport, creating it if necessary."""
+    global _transport
+    if _transport is None:
+        _transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=NOTION_MAX_CONNECTIONS,
+                max_keepalive_connections=NOTION_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=NOTION_KEEPALIVE_EXPIRY
+            )
+        )
+        logger.info(f"Created Notion connection pool (max connections: {NOTION_MAX_CONNECTIONS})")
+    return _transport
+
+def get_request_timeout():
+    """Build the per-request timeout applied to every Notion call."""
+    return httpx.Timeout(
+        NOTION_REQUEST_TIMEOUT,
+        connect=NOTION_CONNECT_TIMEOUT,
+        pool=NOTION_POOL_TIMEOUT
+    )
+
+def get_retry_after(error, attempt):
+    """Seconds to wait before retrying a rate-limited request."""
     try:
-        client = Client(auth=NOTION_API_KEY)
+        return float(error.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return float(2 ** attempt)
+
+class GovernedAsyncClient(AsyncClient):
+    """Async Notion client whose requests pass through a circuit breaker and a RequestGovernor."""
+
+    def __init__(self, governor, breaker, **kwargs):
+        self.governor = governor
+        self.breaker = breaker
+        super().__init__(**kwargs)
+
+    async def _send(self, path, method, query, body, auth):
+        attempt = 0
+        while True:
+            await self.governor.acquire()
+            try:
+                return await super().request(path, method, query, body, auth)
+            except HTTPResponseError as e:
+                if e.status != 429 or attempt >= NOTION_MAX_RETRIES:
+                    raise
+                self.governor.pause(get_retry_after(e, attempt))
+                attempt += 1
+
+    async def request(self, path, method, query=None, body=None, auth=None):
+        """Send a request once the breaker and governor allow it, retrying on 429."""
+        # Fail fast while Notion is known to be down instead of queueing for a slot
+        self.breaker.before_request()
+        try:
+            response = await self._send(path, method, query, body, auth)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_outage_error(e):
+                self.breaker.record_failure()
+            else:
+                # Notion answered, so the service itself is up
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return response
+
+# Rate limiter shared by every request made with the bot's Notion integration
+governor = RequestGovernor(rate=NOTION_RATE_LIMIT, burst=NOTION_RATE_BURST)
+
+# Circuit breaker shared by every Notion client: an outage affects all integrations
+breaker = CircuitBreaker(
+    "Notion",
+    failure_threshold=NOTION_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=NOTION_BREAKER_RESET_TIMEOUT
+)
+
+def create_notion_client(auth=NOTION_API_KEY, request_governor=None):
+    """Create and return an async Notion client bound to the shared connection pool."""
+    try:
+        client = GovernedAsyncClient(
+            request_governor or governor,
+            breaker,
+            auth=auth,
+            client=httpx.AsyncClient(transport=get_transport())
+        )
+        # notion_client resets the timeout from timeout_ms when it adopts the
+        # HTTP client, so apply the granular timeout afterwards
+        client.client.timeout = get_request_timeout()
         logger.info("Notion client created successfully")
         return client
     except Exception as e:
@@ -20,4 +121,57 @@ def get_notion_client():
     global notion_client
     if notion_client is None:
         notion_client = create_notion_client()
-    return notion_client
\ No newline at end of file
+    return notion_client
+
+def _on_tenant_client_evicted(api_key, client):
+    # Tenant clients share the process-wide transport, so dropping the
+    # reference is enough; closing the client would close the shared pool
+    logger.info("Evicted idle tenant Notion client")
+
+# Clients for per-chat integrations, keyed by integration secret. Each has its
+# own governor because Notion rate-limits per integration.
+tenant_clients = LRUCache(
+    NOTION_CLIENT_REGISTRY_SIZE,
+    ttl=NOTION_CLIENT_IDLE_TTL,
+    on_evict=_on_tenant_client_evicted
+)
+
+def get_tenant_client(api_key):
+    """Get the Notion client for an integration secret, creating it if necessary."""
+    if not api_key or api_key == NOTION_API_KEY:
+        return get_notion_client()
+
+    client = tenant_clients.get(api_key)
+    if client is MISSING:
+        client = create_notion_client(
+            auth=api_key,
+            request_governor=RequestGovernor(rate=NOTION_RATE_LIMIT, burst=NOTION_RATE_BURST)
+        )
+        tenant_clients.set(api_key, client)
+    return client
+
+def create_probe_client(api_key):
+    """Create a client for checking an integration secret before it is saved.
+
+    The client stays out of ``tenant_clients``, so unverified secrets cannot
+    evict the clients of working tenants.
+    """
+    return create_notion_client(
+        auth=api_key,
+        request_governor=RequestGovernor(rate=NOTION_RATE_LIMIT, burst=NOTION_RATE_BURST)
+    )
+
+def register_tenant_client(api_key, client):
+    """Keep a verified probe client for reuse by get_tenant_client."""
+    if api_key and api_key != NOTION_API_KEY and api_key not in tenant_clients:
+        tenant_clients.set(api_key, client)
+
+async def close_notion_client():
+    """Close the shared connection pool and drop all clients."""
+    global notion_client, _transport
+    notion_client = None
+    tenant_clients.clear()
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
+        logger.info("Notion connection pool closed")
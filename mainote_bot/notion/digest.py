@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+from collections import namedtuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from mainote_bot.config import (
+    DIGEST_CACHE_SIZE, DIGEST_FETCH_CONCURRENCY, DIGEST_FETCH_TIMEOUT, NOTIFICATION_CHAT_IDS
+)
+from mainote_bot.utils.logging import logger
+from mainote_bot.utils.lru import LRUCache, MISSING
+from mainote_bot.notion.tasks import get_active_tasks_cache, iter_active_tasks
+from mainote_bot.notion.workspaces import get_chat_workspace, get_chat_workspaces, get_default_workspace
+from mainote_bot.notion.records import task_from_note
+from mainote_bot.database import get_active_chat_notes
+
+# Telegram rejects messages longer than this many characters
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+TASK_EMOJI = {
+    "idea": "💡",
+    "task": "✅",
+    "personal": "🏖"
+}
+
+EMPTY_DIGEST = "Доброе утро! У вас нет активных задач на сегодня. Хорошего дня! 🌞"
+DIGEST_HEADER = "🌅 Доброе утро! Вот ваш план на сегодня:\n\n"
+DIGEST_CONTINUATION_HEADER = "📋 Продолжение плана:\n\n"
+DIGEST_FOOTER = "\nУдачного и продуктивного дня! 💪"
+DIGEST_UNAVAILABLE = "Не удалось получить список задач. Попробуйте позже."
+
+# Digest source of chats without a Notion workspace of their own: their notes
+NotesSource = namedtuple('NotesSource', ['chat_id'])
+# A chat's rendered digest and the source snapshot it was rendered from
+ChatDigest = namedtuple('ChatDigest', ['source', 'version', 'digest_id', 'pages'])
+
+# Rendered digests: digest ID -> (source, pages), looked up by page buttons
+_rendered = LRUCache(DIGEST_CACHE_SIZE)
+# (source, snapshot version, task limit) -> digest ID, shared by every chat of the source
+_digest_ids = LRUCache(DIGEST_CACHE_SIZE)
+_next_digest_id = itertools.count(1)
+
+def task_line(number, task):
+    """Render one digest line for a Task."""
+    return f"{number}. {TASK_EMOJI.get(task.type, '📝')} {task.title or 'Без названия'}\n"
+
+class DigestRenderer:
+    """Render the morning digest one task at a time, split into pages of at most ``max_length`` characters.
+
+    Pages break between lines; the header opens the first page and the footer
+    closes the last one. Pass ``max_length=None`` for a single page.
+    """
+
+    def __init__(self, max_length=TELEGRAM_MESSAGE_LIMIT):
+        self.limit = max_length or float("inf")
+        # Longest line that still fits on a page of its own
+        self.max_line = self.limit - len(DIGEST_HEADER) - len(DIGEST_FOOTER)
+        self._pages = []
+        self._page = [DIGEST_HEADER]
+        self._length = len(DIGEST_HEADER)
+        self.rendered = 0
+
+    def add(self, task):
+        """Append the next task's line."""
+        line = task_line(self.rendered + 1, task)
+        if len(line) > self.max_line:
+            line = line[:int(self.max_line) - 2] + "…\n"
+        # Keep room for the footer so the last page never overflows
+        if self._length + len(line) + len(DIGEST_FOOTER) > self.limit and self.rendered:
+            self._pages.append("".join(self._page))
+            self._page = [DIGEST_CONTINUATION_HEADER]
+            self._length = len(DIGEST_CONTINUATION_HEADER)
+        self._page.append(line)
+        self._length += len(line)
+        self.rendered += 1
+
+    def pages(self):
+        """Close the last page and return every page."""
+        if not self.rendered:
+            return [EMPTY_DIGEST]
+        return self._pages + ["".join(self._page) + DIGEST_FOOTER]
+
+def render_digest(tasks, max_length=TELEGRAM_MESSAGE_LIMIT):
+    """Render the morning digest of a task iterable in one pass (see DigestRenderer)."""
+    renderer = DigestRenderer(max_length)
+    for task in tasks:
+        renderer.add(task)
+    return renderer.pages()
+
+def digest_source(chat_id, workspace):
+    """Get where a chat's digest tasks come from, given its own workspace (or None).
+
+    Chats with their own Notion workspace read its database; recipients
+    configured in NOTIFICATION_CHAT_IDS read the deployment-wide database;
+    everyone else reads the notes they sent to the bot.
+    """
+    if workspace is not None:
+        return workspace
+    if chat_id in NOTIFICATION_CHAT_IDS:
+        return get_default_workspace()
+    return NotesSource(chat_id)
+
+async def get_digest_source(chat_id):
+    """Get where a chat's digest tasks come from."""
+    return digest_source(str(chat_id), await get_chat_workspace(chat_id))
+
+async def fetch_digest_tasks(sources, limit=None):
+    """Fetch the tasks of many digest sources, each source once.
+
+    Notes of all note-backed chats are read with one query; Notion databases
+    are fetched through their snapshot caches, at most DIGEST_FETCH_CONCURRENCY
+    at a time and within DIGEST_FETCH_TIMEOUT. Returns source ->
+    ``(version, tasks)``; sources that failed or ran out of time are left out.
+    """
+    results = {}
+    notes_sources = [source for source in sources if isinstance(source, NotesSource)]
+    notion_sources = [source for source in sources if not isinstance(source, NotesSource)]
+
+    if notes_sources:
+        notes = await get_active_chat_notes([source.chat_id for source in notes_sources], limit)
+        if notes is not None:
+            for source in notes_sources:
+                tasks = [task_from_note(note) for note in notes.get(source.chat_id, [])]
+                results[source] = (hash(tuple(tasks)), tasks)
+
+    semaphore = asyncio.Semaphore(DIGEST_FETCH_CONCURRENCY)
+
+    async def fetch(workspace):
+        async with semaphore:
+            try:
+                snapshot = await get_active_tasks_cache(workspace).get_snapshot()
+                results[workspace] = (snapshot.version, snapshot.data)
+            except Exception as e:
+                logger.error(f"Error querying Notion database {workspace.database_id} for active tasks: {str(e)}")
+
+    if notion_sources:
+        fetches = [asyncio.create_task(fetch(workspace)) for workspace in notion_sources]
+        _, pending = await asyncio.wait(fetches, timeout=DIGEST_FETCH_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Gave up on {len(pending)} of {len(notion_sources)} Notion digest sources after {DIGEST_FETCH_TIMEOUT}s")
+    return results
+
+def render_source_digest(source, version, tasks, limit=None):
+    """Render a source's digest once per snapshot version. Returns ``(digest_id, pages)``."""
+    key = (source, version, limit)
+    digest_id = _digest_ids.get(key)
+    if digest_id is not MISSING:
+        rendered = _rendered.get(digest_id)
+        if rendered is not MISSING:
+            return digest_id, rendered[1]
+
+    tasks = tasks[:limit] if limit is not None else tasks
+    pages = render_digest(tasks)
+    digest_id = next(_next_digest_id)
+    _digest_ids.set(key, digest_id)
+    _rendered.set(digest_id, (source, pages))
+    return digest_id, pages
+
+async def get_chat_digests(chat_ids, limit=None):
+    """Get the rendered digest of many chats, fetching every shared source once.
+
+    Returns chat_id -> ChatDigest; chats whose tasks could not be fetched are
+    left out.
+    """
+    workspaces = await get_chat_workspaces(chat_ids)
+    sources = {str(chat_id): digest_source(str(chat_id), workspaces[str(chat_id)]) for chat_id in chat_ids}
+    tasks = await fetch_digest_tasks(set(sources.values()), limit)
+
+    digests = {}
+    for chat_id, source in sources.items():
+        if source in tasks:
+            version, source_tasks = tasks[source]
+            digests[chat_id] = ChatDigest(source, version, *render_source_digest(source, version, source_tasks, limit))
+    logger.info(
+        f"Prepared digests of {len(digests)} out of {len(sources)} chats from {len(tasks)} sources "
+        f"({len(set(sources.values()))} requested)"
+    )
+    return digests
+
+async def get_chat_digest_pages(chat_id, limit=None):
+    """Get the rendered digest of one chat. Returns ``(digest_id, pages)``."""
+    digest = (await get_chat_digests([chat_id], limit)).get(str(chat_id))
+    if digest is None:
+        return None, [DIGEST_UNAVAILABLE]
+    return digest.digest_id, digest.pages
+
+async def stream_chat_digest_pages(chat_id, limit=None):
+    """Get the rendered digest of one chat, streaming its tasks when no snapshot is cached.
+
+    Loading a cold snapshot reads every active task before the first line is
+    rendered; instead the first ``limit`` tasks are read from Notion one
+    result page at a time and rendered as they arrive, and the remaining
+    pages are never requested. Chats reading their notes, warm snapshots and
+    failed streams (e.g. while Notion is down, when the snapshot may still be
+    served stale) go through get_chat_digest_pages. Returns ``(digest_id, pages)``.
+    """
+    source = await get_digest_source(chat_id)
+    if isinstance(source, NotesSource) or get_active_tasks_cache(source).is_fresh():
+        return await get_chat_digest_pages(chat_id, limit)
+
+    renderer = DigestRenderer()
+    try:
+        async for task in iter_active_tasks(limit=limit, workspace=source):
+            renderer.add(task)
+    except Exception as e:
+        logger.warning(f"Streaming the digest of chat ID {chat_id} failed, using the snapshot: {str(e)}")
+        return await get_chat_digest_pages(chat_id, limit)
+
+    pages = renderer.pages()
+    digest_id = next(_next_digest_id)
+    _rendered.set(digest_id, (source, pages))
+    return digest_id, pages
+
+def is_digest_current(digest):
+    """Whether a digest's source has not changed since it was rendered, as far as known without a fetch.
+
+    Notes live in the local database and are cheap to re-read in bulk, so
+    note-backed digests are always re-checked.
+    """
+    if isinstance(digest.source, NotesSource):
+        return False
+    return get_active_tasks_cache(digest.source).is_current(digest.version)
+
+def get_cached_digest_page(digest_id, page, source):
+    """Get a previously rendered page of the source's digest, or None if it is no longer cached."""
+    rendered = _rendered.get(digest_id)
+    # Digest IDs are per process, so only show pages rendered for the same source
+    if rendered is MISSING or rendered[0] != source or not 0 <= page < len(rendered[1]):
+        return None, 0
+    return rendered[1][page], len(rendered[1])
+
+def build_digest_keyboard(digest_id, page, total):
+    """Build navigation buttons for a paged digest, or None for a single page."""
+    if total <= 1 or digest_id is None:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀ Назад", callback_data=f"digest:{digest_id}:{page - 1}"))
+    buttons.append(InlineKeyboardButton(f"{page + 1}/{total}", callback_data=f"digest:{digest_id}:{page}"))
+    if page < total - 1:
+        buttons.append(InlineKeyboardButton("Далее ▶", callback_data=f"digest:{digest_id}:{page + 1}"))
+    return InlineKeyboardMarkup([buttons])
+
+def digest_messages(digest_id, pages, paged=True):
+    """List the ``(text, reply_markup)`` messages a digest is sent as.
+
+    Paged digests are one message with navigation buttons; otherwise every
+    page is its own message.
+    """
+    if paged:
+        return [(pages[0], build_digest_keyboard(digest_id, 0, len(pages)))]
+    return [(page, None) for page in pages]
+
+async def send_digest(bot, chat_id, digest_id, pages, paged=True):
+    """Send a rendered digest to a single chat."""
+    for text, reply_markup in digest_messages(digest_id, pages, paged):
+        await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from mainote_bot.utils.logging import logger
+
+# Priority lanes; lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+LANE_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background"
+}
+
+# Lane used by Notion calls made from the current task
+_current_priority = ContextVar('notion_priority', default=PRIORITY_INTERACTIVE)
+
+@contextmanager
+def notion_priority(priority):
+    """Run the enclosed Notion calls in the given priority lane."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority():
+    """Get the priority lane of the current task."""
+    return _current_priority.get()
+
+class RequestGovernor:
+    """Token bucket shared by all requests made with one API credential.
+
+    Requests that cannot get a token right away queue by priority lane, so
+    interactive calls always overtake queued background work. A 429 response
+    pauses the whole bucket for the server-provided ``Retry-After``.
+    """
+
+    def __init__(self, rate, burst, name="Notion"):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self._stats = {
+            lane: {"requests": 0, "queued": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for lane in LANE_NAMES
+        }
+        self.rate_limited = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _record(self, priority, waited):
+        stats = self._stats[priority]
+        stats["requests"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+
+    async def acquire(self, priority=None):
+        """Wait for a request slot in the given (or current) priority lane."""
+        if priority is None:
+            priority = current_priority()
+        now = time.monotonic()
+        self._refill(now)
+
+        # Fast path: nobody is queued and a token is available
+        if not self._waiters and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            self._record(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._stats[priority]["queued"] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        await future
+        self._record(priority, time.monotonic() - now)
+
+    async def _dispatch(self):
+        """Hand out tokens to queued requests in priority order."""
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            self._refill(now)
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+
+            priority, _, future = heapq.heappop(self._waiters)
+            self._stats[priority]["queued"] -= 1
+            if future.done():
+                # Caller was cancelled while waiting
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` (e.g. after a 429)."""
+        self.rate_limited += 1
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = now
+        logger.warning(f"{self.name} rate limit hit, pausing requests for {seconds:.1f}s")
+
+    def stats(self):
+        """Return queue depth and wait-time metrics per lane."""
+        lanes = {}
+        for priority, name in LANE_NAMES.items():
+            stats = self._stats[priority]
+            lanes[name] = {
+                "queue_depth": stats["queued"],
+                "requests": stats["requests"],
+                "avg_wait_ms": round(stats["total_wait"] / stats["requests"] * 1000, 1) if stats["requests"] else 0.0,
+                "max_wait_ms": round(stats["max_wait"] * 1000, 1)
+            }
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "rate_limited_responses": self.rate_limited,
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "lanes": lanes
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import time
+import uuid
+from mainote_bot.config import (
+    NOTION_DATABASE_ID, NOTION_MIRROR_INTERVAL, NOTION_MIRROR_FULL_SYNC_INTERVAL
+)
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.tasks import iter_database_pages, active_tasks_cache
+from mainote_bot.notion.records import plain_text, task_from_page
+from mainote_bot.notion.governor import notion_priority, PRIORITY_BACKGROUND
+from mainote_bot.notion.client import breaker
+from mainote_bot.database import get_notion_sync_cursor, upsert_mirrored_pages
+
+# Properties copied into the notes table; the rest are not requested
+MIRROR_PROPERTIES = ["Name", "Content", "Type", "Status", "Note ID"]
+
+# Background task mirroring the Notion database into the notes table
+_mirror_task = None
+# Monotonic time of the last full pass made by this process
+_last_full_sync = None
+
+def parse_note_id(properties):
+    """Get the local note UUID stored on a page pushed by the note sync, or None."""
+    try:
+        return uuid.UUID(plain_text(properties.get("Note ID", {}).get("rich_text")).strip())
+    except ValueError:
+        return None
+
+def page_to_mirror_row(page):
+    """Extract the mirrored columns from a Notion page."""
+    task = task_from_page(page)
+
+    if page.get("archived") or page.get("in_trash"):
+        status = "deleted"
+    elif task.status == "active":
+        status = "active"
+    else:
+        status = "archived"
+
+    properties = page.get("properties", {})
+    return {
+        "page_id": task.id,
+        "title": task.title or None,
+        "content": plain_text(properties.get("Content", {}).get("rich_text")),
+        "category": task.type,
+        "status": status,
+        "last_edited_time": task.last_edited,
+        "note_id": parse_note_id(properties)
+    }
+
+async def mirror_notion_database(full_sync=False):
+    """Copy pages changed since the last pass into the notes table.
+
+    Incremental passes ask Notion only for pages edited at or after the stored
+    cursor (Notion rounds last_edited_time to the minute, so the boundary
+    minute is re-read and deduplicated by the upsert). Full passes read every
+    page and mark pages that disappeared from Notion as deleted.
+    Returns the number of changed rows.
+    """
+    cursor = await get_notion_sync_cursor(NOTION_DATABASE_ID)
+    if cursor is None:
+        raise RuntimeError("Notion sync cursor is unavailable")
+
+    last_edited_time = cursor.get("last_edited_time")
+    full_sync = full_sync or last_edited_time is None
+
+    query_filter = None
+    if not full_sync:
+        query_filter = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": last_edited_time.isoformat()}
+        }
+
+    rows = []
+    with notion_priority(PRIORITY_BACKGROUND):
+        async for page in iter_database_pages(
+            filter=query_filter,
+            sorts=[{"timestamp": "last_edited_time", "direction": "ascending"}],
+            properties=MIRROR_PROPERTIES
+        ):
+            rows.append(page_to_mirror_row(page))
+
+    newest = max((row["last_edited_time"] for row in rows if row["last_edited_time"]), default=last_edited_time)
+    changed = await upsert_mirrored_pages(NOTION_DATABASE_ID, rows, newest, full_sync=full_sync)
+
+    if changed:
+        active_tasks_cache.invalidate()
+    logger.info(f"Mirrored {len(rows)} Notion pages ({changed} changed, full sync: {full_sync})")
+    return changed
+
+async def run_notion_mirror():
+    """Mirror the Notion database periodically until cancelled."""
+    global _last_full_sync
+    logger.info("🔄 Starting Notion mirror loop")
+    while True:
+        try:
+            if breaker.is_open():
+                logger.info("Notion circuit is open, skipping mirror pass")
+                await asyncio.sleep(NOTION_MIRROR_INTERVAL)
+                continue
+            full_sync = (
+                _last_full_sync is None or
+                time.monotonic() - _last_full_sync >= NOTION_MIRROR_FULL_SYNC_INTERVAL
+            )
+            await mirror_notion_database(full_sync=full_sync)
+            if full_sync:
+                _last_full_sync = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error mirroring Notion database: {str(e)}", exc_info=True)
+
+        await asyncio.sleep(NOTION_MIRROR_INTERVAL)
+
+def start_notion_mirror():
+    """Start the Notion mirror in the main event loop."""
+    global _mirror_task
+    if _mirror_task is not None and not _mirror_task.done():
+        logger.info("Notion mirror already running")
+        return
+    _mirror_task = asyncio.create_task(run_notion_mirror())
+    logger.info("Notion mirror task created and started")
+
+async def stop_notion_mirror():
+    """Stop the Notion mirror."""
+    global _mirror_task
+    if _mirror_task is not None:
+        _mirror_task.cancel()
+        try:
+            await _mirror_task
+        except asyncio.CancelledError:
+            pass
+        _mirror_task = None
+        logger.info("Notion mirror stopped")
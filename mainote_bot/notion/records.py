@@ -0,0 +1,37 @@
+from collections import namedtuple
+from datetime import datetime
+
+# Compact task record passed around the bot instead of raw Notion page JSON.
+# Namedtuples have no per-instance __dict__, so large snapshots stay small.
+Task = namedtuple('Task', ['id', 'title', 'type', 'status', 'last_edited'])
+
+def parse_notion_time(value):
+    """Parse a Notion ISO 8601 timestamp."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")) if value else None
+
+def plain_text(rich_text):
+    """Join the plain text of a Notion rich text array."""
+    return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in rich_text or [])
+
+def task_from_page(page):
+    """Parse a Notion page into a Task."""
+    properties = page.get("properties", {})
+    type_select = properties.get("Type", {}).get("select") or {}
+    status_select = properties.get("Status", {}).get("select") or {}
+    return Task(
+        page["id"],
+        plain_text(properties.get("Name", {}).get("title")),
+        type_select.get("name") or "task",
+        status_select.get("name"),
+        parse_notion_time(page.get("last_edited_time"))
+    )
+
+def task_from_note(note):
+    """Build a Task from a mirrored notes row."""
+    return Task(
+        note["notion_page_id"],
+        note["title"] or "",
+        note["category"] or "task",
+        note["status"],
+        note["notion_last_edited_at"]
+    )
\ No newline at end of file
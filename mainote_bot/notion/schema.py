@@ -0,0 +1,81 @@
+from collections import namedtuple
+from urllib.parse import unquote
+from mainote_bot.config import NOTION_DB_SCHEMA, NOTE_CATEGORIES
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.workspaces import get_default_workspace
+
+# Property IDs, types and select option names of a Notion database
+DatabaseSchema = namedtuple('DatabaseSchema', ['database_id', 'property_ids', 'property_types', 'options'])
+
+# Select options the bot writes or filters on
+REQUIRED_OPTIONS = {
+    'Type': set(NOTE_CATEGORIES),
+    'Status': {'active'}
+}
+
+# database_id -> DatabaseSchema, filled once at startup
+_schemas = {}
+
+def parse_database_schema(database):
+    """Build a DatabaseSchema from a Notion database object."""
+    property_ids = {}
+    property_types = {}
+    options = {}
+    for name, prop in database.get("properties", {}).items():
+        # IDs come URL-encoded; store them decoded so query strings encode them once
+        property_ids[name] = unquote(prop["id"])
+        property_types[name] = prop["type"]
+        if prop["type"] in ("select", "multi_select", "status"):
+            options[name] = {option["name"] for option in prop[prop["type"]].get("options", [])}
+    return DatabaseSchema(database["id"], property_ids, property_types, options)
+
+def validate_schema(schema):
+    """Compare a database schema with NOTION_DB_SCHEMA. Returns a list of problems."""
+    problems = []
+    for name, expected_type in NOTION_DB_SCHEMA.items():
+        actual_type = schema.property_types.get(name)
+        if actual_type is None:
+            problems.append(f"missing property '{name}' ({expected_type})")
+        elif actual_type != expected_type:
+            problems.append(f"property '{name}' is {actual_type}, expected {expected_type}")
+
+    for name, required in REQUIRED_OPTIONS.items():
+        missing = required - schema.options.get(name, set())
+        if name in schema.options and missing:
+            problems.append(f"property '{name}' has no options {', '.join(sorted(missing))}")
+    return problems
+
+async def load_database_schema(workspace=None):
+    """Introspect a Notion database, validate it and cache its property IDs.
+
+    Returns the schema, or None if the database could not be read.
+    """
+    notion, database_id = workspace or get_default_workspace()
+    try:
+        schema = parse_database_schema(await notion.databases.retrieve(database_id=database_id))
+    except Exception as e:
+        logger.error(f"Error reading Notion database schema: {str(e)}", exc_info=True)
+        return None
+
+    problems = validate_schema(schema)
+    for problem in problems:
+        logger.error(f"Notion database {database_id}: {problem}")
+    if not problems:
+        logger.info(f"Notion database {database_id} matches the expected schema")
+
+    _schemas[database_id] = schema
+    return schema
+
+def get_property_ids(database_id, names):
+    """Map property names to IDs for ``filter_properties``.
+
+    Returns None (request every property) if the database was not introspected
+    or lacks one of the properties.
+    """
+    schema = _schemas.get(database_id)
+    if schema is None:
+        return None
+    try:
+        return [schema.property_ids[name] for name in names]
+    except KeyError:
+        return None
\ No newline at end of file
@@ -0,0 +1,160 @@
+import asyncio
+import math
+import time
+from mainote_bot.config import (
+    NOTE_SYNC_INTERVAL, NOTE_SYNC_BATCH_SIZE, NOTE_SYNC_CONCURRENCY,
+    NOTE_SYNC_MAX_ATTEMPTS, NOTE_SYNC_RETRY_DELAY, NOTION_REQUEST_TIMEOUT, NOTION_CONNECT_TIMEOUT,
+    NOTION_POOL_TIMEOUT, NOTION_MAX_RETRIES, NOTION_RATE_LIMIT
+)
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.tasks import create_note, find_note_page, update_note_type
+from mainote_bot.notion.workspaces import get_workspace
+from mainote_bot.notion.client import breaker
+from mainote_bot.database import (
+    claim_notes_for_sync, mark_notes_synced, mark_note_sync_failed
+)
+
+# Longest delay between retries of a failing note (seconds)
+MAX_RETRY_DELAY = 3600
+# Notion requests per push: the lookup of an earlier page, then the create
+PUSH_REQUESTS = 2
+# Longest one Notion request can take: waiting for a pooled connection,
+# connecting and reading the response, for the first try and every 429 retry
+# (with the client's default backoff between them)
+REQUEST_BUDGET = (
+    (NOTION_MAX_RETRIES + 1) * (NOTION_POOL_TIMEOUT + NOTION_CONNECT_TIMEOUT + NOTION_REQUEST_TIMEOUT) +
+    sum(2 ** attempt for attempt in range(NOTION_MAX_RETRIES))
+)
+# Time left after the pushes to record their results before the lease expires
+LEASE_MARGIN = 30
+
+# Background task pushing locally captured notes to Notion
+_sync_task = None
+# Set when new notes are queued so the syncer does not wait for the next poll
+_wake_event = None
+
+def wake_note_sync():
+    """Ask the syncer to run a pass now instead of waiting for the poll interval."""
+    if _wake_event is not None:
+        _wake_event.set()
+
+def note_sync_lease():
+    """Seconds a claimed batch is leased for.
+
+    Covers every wave of NOTE_SYNC_CONCURRENCY pushes taking REQUEST_BUDGET
+    per request, plus the governor wait for the batch's own requests at
+    NOTION_RATE_LIMIT; pushes still running at the end are cancelled, so no
+    push outlives its lease.
+    """
+    waves = math.ceil(NOTE_SYNC_BATCH_SIZE / max(NOTE_SYNC_CONCURRENCY, 1))
+    governor_wait = NOTE_SYNC_BATCH_SIZE * PUSH_REQUESTS / NOTION_RATE_LIMIT
+    return waves * PUSH_REQUESTS * REQUEST_BUDGET + governor_wait + LEASE_MARGIN
+
+async def push_note(note):
+    """Create a Notion page for a local note in its chat's workspace.
+
+    A page an earlier push already created (the note's UUID is stored on it)
+    is reused, so a push that is repeated after a lost write-back or an
+    expired lease does not create a duplicate. Returns the Notion page ID and
+    the database it was created in.
+    """
+    workspace = await get_workspace(note['chat_id'])
+    page = await find_note_page(note['uuid_id'], workspace=workspace)
+    if page is not None:
+        logger.info(f"Note {note['uuid_id']} already has Notion page {page['id']}, reusing it")
+        return page['id'], workspace.database_id
+    page = await create_note(
+        note['content'], note_type=note['category'], source=note['source'], workspace=workspace, note_id=note['uuid_id']
+    )
+    return page['id'], workspace.database_id
+
+async def sync_pending_notes():
+    """Push one batch of pending notes to Notion. Returns the number of notes claimed."""
+    # Leave notes queued while Notion is down so they do not burn retry attempts
+    if breaker.is_open():
+        logger.info("Notion circuit is open, postponing note sync")
+        return 0
+
+    lease = note_sync_lease()
+    deadline = time.monotonic() + lease - LEASE_MARGIN
+    notes = await claim_notes_for_sync(NOTE_SYNC_BATCH_SIZE, lease)
+    if not notes:
+        return 0
+
+    semaphore = asyncio.Semaphore(NOTE_SYNC_CONCURRENCY)
+
+    async def push(note):
+        async with semaphore:
+            try:
+                return note, *(await asyncio.wait_for(push_note(note), max(0.0, deadline - time.monotonic()))), None
+            except asyncio.TimeoutError:
+                return note, None, None, TimeoutError("push did not finish within the sync lease")
+            except Exception as e:
+                return note, None, None, e
+
+    results = await asyncio.gather(*(push(note) for note in notes))
+
+    synced = []
+    pushed_categories = {}
+    for note, page_id, database_id, error in results:
+        if page_id:
+            synced.append((note['uuid_id'], page_id, database_id))
+            pushed_categories[str(note['uuid_id'])] = note['category']
+            continue
+
+        attempts = note['sync_attempts'] + 1
+        give_up = attempts >= NOTE_SYNC_MAX_ATTEMPTS
+        retry_delay = min(NOTE_SYNC_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+        await mark_note_sync_failed(note['uuid_id'], str(error), retry_delay, give_up)
+        if give_up:
+            logger.error(f"Giving up syncing note {note['uuid_id']} after {attempts} attempts: {error}")
+        else:
+            logger.warning(f"Failed to sync note {note['uuid_id']} (attempt {attempts}), retrying in {retry_delay}s: {error}")
+
+    # The user may have picked a type while the page was being created
+    for row in await mark_notes_synced(synced):
+        if row['category'] != pushed_categories.get(str(row['uuid_id'])):
+            workspace = await get_workspace(row['chat_id'])
+            await update_note_type(row['notion_page_id'], row['category'], workspace=workspace)
+
+    logger.info(f"Synced {len(synced)} out of {len(notes)} notes to Notion")
+    return len(notes)
+
+async def run_note_sync():
+    """Push pending notes to Notion until cancelled."""
+    logger.info("🔄 Starting Notion note sync loop")
+    while True:
+        try:
+            _wake_event.clear()
+            # Drain full batches back to back, then wait for new work
+            while await sync_pending_notes() >= NOTE_SYNC_BATCH_SIZE:
+                pass
+        except Exception as e:
+            logger.error(f"Error in note sync loop: {str(e)}", exc_info=True)
+
+        try:
+            await asyncio.wait_for(_wake_event.wait(), timeout=NOTE_SYNC_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def start_note_sync():
+    """Start the background note syncer in the main event loop."""
+    global _sync_task, _wake_event
+    if _sync_task is not None and not _sync_task.done():
+        logger.info("Note sync already running")
+        return
+    _wake_event = asyncio.Event()
+    _sync_task = asyncio.create_task(run_note_sync())
+    logger.info("Note sync task created and started")
+
+async def stop_note_sync():
+    """Stop the background note syncer."""
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        try:
+            await _sync_task
+        except asyncio.CancelledError:
+            pass
+        _sync_task = None
+        logger.info("Note sync stopped")
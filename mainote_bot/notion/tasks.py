@@ -1,79 +1,176 @@
-from mainote_bot.notion.client import get_notion_client
-from mainote_bot.config import NOTION_DATABASE_ID, NOTE_CATEGORIES
+from mainote_bot.notion.workspaces import get_default_workspace
+from mainote_bot.notion.cache import SnapshotCache
+from mainote_bot.notion.breaker import CircuitOpenError, hedged
+from mainote_bot.notion.schema import get_property_ids
+from mainote_bot.notion.records import task_from_page, task_from_note
+from mainote_bot.utils.lru import LRUCache, MISSING
+from mainote_bot.config import (
+    NOTION_DATABASE_ID, NOTE_CATEGORIES, NOTION_PAGE_SIZE, ACTIVE_TASKS_CACHE_TTL,
+    NOTION_MIRROR_ENABLED, NOTION_MIRROR_MAX_STALENESS, NOTION_HEDGE_DELAY, NOTION_CLIENT_REGISTRY_SIZE,
+    NOTION_CLIENT_IDLE_TTL
+)
+from mainote_bot.database import get_mirrored_active_notes
 from mainote_bot.utils.logging import logger
 
-async def get_active_tasks():
-    """Query Notion database for active tasks."""
-    try:
-        notion = get_notion_client()
-        # Query Notion for active tasks
-        response = notion.databases.query(
-            database_id=NOTION_DATABASE_ID,
-            filter={
-                "and": [
-                    {
-                        "property": "Status",
-                        "select": {
-                            "equals": "active"
-                        }
-                    }
-                ]
+# Filter shared by every active-task query
+ACTIVE_TASKS_FILTER = {
+    "and": [
+        {
+            "property": "Status",
+            "select": {
+                "equals": "active"
             }
+        }
+    ]
+}
+
+# Properties read from active tasks; the rest are not requested
+TASK_PROPERTIES = ["Name", "Type", "Status"]
+
+async def iter_database_pages(filter=None, sorts=None, page_size=NOTION_PAGE_SIZE, limit=None, workspace=None,
+                              hedge=False, properties=None):
+    """Yield pages of a Notion database, following pagination cursors.
+
+    Pages are requested only when the consumer asks for more items, so a slow
+    consumer never has more than one page in memory and stopping early (or
+    passing ``limit``) skips the remaining requests. ``workspace`` defaults to
+    the deployment-wide database. With ``hedge`` each query is duplicated if it
+    is slower than NOTION_HEDGE_DELAY. ``properties`` limits the returned page
+    properties to the given names when the database schema is known.
+    """
+    notion, database_id = workspace or get_default_workspace()
+    page_size = max(1, min(page_size, 100))  # Notion caps page_size at 100
+    property_ids = get_property_ids(database_id, properties) if properties else None
+    start_cursor = None
+    yielded = 0
+
+    while True:
+        query = {
+            "database_id": database_id,
+            "page_size": page_size if limit is None else min(page_size, limit - yielded)
+        }
+        if filter:
+            query["filter"] = filter
+        if sorts:
+            query["sorts"] = sorts
+        if start_cursor:
+            query["start_cursor"] = start_cursor
+        if property_ids:
+            query["filter_properties"] = property_ids
+
+        if hedge and NOTION_HEDGE_DELAY > 0:
+            response = await hedged(lambda: notion.databases.query(**query), NOTION_HEDGE_DELAY)
+        else:
+            response = await notion.databases.query(**query)
+
+        for page in response["results"]:
+            yield page
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+
+        if not response.get("has_more") or not response.get("next_cursor"):
+            return
+        start_cursor = response["next_cursor"]
+
+async def iter_active_tasks(page_size=NOTION_PAGE_SIZE, limit=None, workspace=None):
+    """Yield active tasks straight from Notion as Task records, one result page at a time."""
+    # The query is idempotent, so slow responses can safely be hedged
+    async for page in iter_database_pages(
+        filter=ACTIVE_TASKS_FILTER, page_size=page_size, limit=limit, workspace=workspace, hedge=True,
+        properties=TASK_PROPERTIES
+    ):
+        yield task_from_page(page)
+
+async def _load_active_tasks(workspace=None):
+    """Fetch the full active-task list (as Task records) for the snapshot cache.
+
+    Served from the local Notion mirror when it is fresh enough, otherwise
+    queried from Notion directly.
+    """
+    if NOTION_MIRROR_ENABLED:
+        database_id = workspace.database_id if workspace else NOTION_DATABASE_ID
+        notes = await get_mirrored_active_notes(database_id, NOTION_MIRROR_MAX_STALENESS)
+        if notes is not None:
+            logger.info(f"Found {len(notes)} active tasks in the local mirror")
+            return [task_from_note(note) for note in notes]
+        logger.info("Notion mirror is stale, querying Notion directly")
+
+    tasks = [task async for task in iter_active_tasks(workspace=workspace)]
+    logger.info(f"Found {len(tasks)} active tasks in Notion")
+    return tasks
+
+# Shared snapshot of active tasks, invalidated whenever the bot writes to Notion.
+# While Notion is unreachable the last good snapshot keeps being served.
+active_tasks_cache = SnapshotCache(
+    "active_tasks", _load_active_tasks, ttl=ACTIVE_TASKS_CACHE_TTL, serve_stale=True
+)
+
+# Snapshots of chats' own Notion databases, keyed by workspace, so chats
+# sharing a database share one fetch
+_workspace_tasks_caches = LRUCache(NOTION_CLIENT_REGISTRY_SIZE, ttl=NOTION_CLIENT_IDLE_TTL)
+
+def get_active_tasks_cache(workspace=None):
+    """Get the active-task snapshot cache of a workspace (the deployment-wide one by default)."""
+    if workspace is None or workspace == get_default_workspace():
+        return active_tasks_cache
+    cache = _workspace_tasks_caches.get(workspace)
+    if cache is MISSING:
+        cache = SnapshotCache(
+            f"active_tasks:{workspace.database_id}", lambda: _load_active_tasks(workspace),
+            ttl=ACTIVE_TASKS_CACHE_TTL, serve_stale=True
         )
+        _workspace_tasks_caches.set(workspace, cache)
+    return cache
 
-        logger.info(f"Found {len(response['results'])} active tasks in Notion")
-        return response["results"]
+async def get_active_tasks(limit=None):
+    """Get active tasks from the shared snapshot, reloading it when it is stale."""
+    try:
+        tasks = await active_tasks_cache.get()
+        return tasks[:limit] if limit is not None else list(tasks)
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping active task query: {str(e)}")
+        return []
     except Exception as e:
         logger.error(f"Error querying Notion for active tasks: {str(e)}", exc_info=True)
         return []
 
-async def format_morning_notification(tasks):
-    """Format the morning notification message."""
-    if not tasks:
-        return "Доброе утро! У вас нет активных задач на сегодня. Хорошего дня! 🌞"
+def make_note_title(text):
+    """Build the short title shown for a note."""
+    return text[:50] + "..." if len(text) > 50 else text
 
-    message = "🌅 Доброе утро! Вот ваш план на сегодня:\n\n"
-
-    for i, task in enumerate(tasks, 1):
-        try:
-            # Extract task details
-            title = task["properties"]["Name"]["title"][0]["text"]["content"] if task["properties"]["Name"]["title"] else "Без названия"
-            note_type = task["properties"]["Type"]["select"]["name"] if "select" in task["properties"]["Type"] else "task"
-
-            # Get emoji for task type
-            emoji = {
-                "idea": "💡",
-                "task": "✅",
-                "personal": "🏖"
-            }.get(note_type, "📝")
-
-            message += f"{i}. {emoji} {title}\n"
-        except Exception as e:
-            logger.error(f"Error formatting task {i}: {str(e)}", exc_info=True)
-            continue
+async def find_note_page(note_id, workspace=None):
+    """Find the page an earlier push created for a local note, or None."""
+    async for page in iter_database_pages(
+        filter={"property": "Note ID", "rich_text": {"equals": str(note_id)}}, limit=1, workspace=workspace,
+        properties=["Note ID"]
+    ):
+        return page
+    return None
 
-    message += "\nУдачного и продуктивного дня! 💪"
-    return message
+async def create_note(text, note_type="task", source="telegram-text", workspace=None, note_id=None):
+    """Create a new note in Notion.
 
-def create_note(text):
-    """Create a new note in Notion."""
+    ``note_id`` is the UUID of the local note the page is created for; it is
+    stored on the page so the mirror can match the page to the note.
+    """
     try:
-        notion = get_notion_client()
+        notion, database_id = workspace or get_default_workspace()
         new_page = {
-            "parent": {"database_id": NOTION_DATABASE_ID},
+            "parent": {"database_id": database_id},
             "properties": {
                 "Name": {
                     "title": [
                         {
                             "text": {
-                                "content": text[:50] + "..." if len(text) > 50 else text
+                                "content": make_note_title(text)
                             }
                         }
                     ]
                 },
                 "Type": {
                     "select": {
-                        "name": "task"
+                        "name": note_type
                     }
                 },
                 "Status": {
@@ -85,7 +182,7 @@ def create_note(text):
                     "rich_text": [
                         {
                             "text": {
-                                "content": "telegram-text"
+                                "content": source
                             }
                         }
                     ]
@@ -102,18 +199,25 @@ def create_note(text):
             }
         }
 
-        page = notion.pages.create(**new_page)
+        if note_id:
+            new_page["properties"]["Note ID"] = {"rich_text": [{"text": {"content": str(note_id)}}]}
+
+        page = await notion.pages.create(**new_page)
+        get_active_tasks_cache(workspace).invalidate()
         logger.info(f"Saved to Notion with ID: {page['id']}")
         return page
+    except CircuitOpenError as e:
+        logger.warning(f"Not creating note in Notion: {str(e)}")
+        raise
     except Exception as e:
         logger.error(f"Error creating note in Notion: {str(e)}", exc_info=True)
         raise
 
-def update_note_type(page_id, note_type):
+async def update_note_type(page_id, note_type, workspace=None):
     """Update the type of a note in Notion."""
     try:
-        notion = get_notion_client()
-        notion.pages.update(
+        notion, _ = workspace or get_default_workspace()
+        await notion.pages.update(
             page_id=page_id,
             properties={
                 "Type": {
@@ -123,8 +227,12 @@ def update_note_type(page_id, note_type):
                 }
             }
         )
+        get_active_tasks_cache(workspace).invalidate()
         logger.info(f"Updated note type to {note_type} for page {page_id}")
         return True
+    except CircuitOpenError as e:
+        logger.warning(f"Not updating note type in Notion: {str(e)}")
+        return False
     except Exception as e:
         logger.error(f"Error updating note type: {str(e)}", exc_info=True)
         return False
\ No newline at end of file
@@ -0,0 +1,91 @@
+from collections import namedtuple
+from mainote_bot.config import (
+    NOTION_DATABASE_ID, NOTION_CLIENT_REGISTRY_SIZE, NOTION_CLIENT_IDLE_TTL
+)
+from mainote_bot.notion.client import get_notion_client, get_tenant_client
+from mainote_bot.database import (
+    get_notion_workspace, get_notion_workspaces, set_notion_workspace, delete_notion_workspace
+)
+from mainote_bot.utils.lru import LRUCache, MISSING
+
+# Notion client and target database used for a chat
+NotionWorkspace = namedtuple('NotionWorkspace', ['client', 'database_id'])
+
+# Re-read workspace settings after this many seconds so changes made through
+# another worker are picked up
+WORKSPACE_CONFIG_MAX_AGE = 300
+
+# chat_id -> (api_key, database_id), or None for chats using the default workspace
+_workspace_configs = LRUCache(
+    NOTION_CLIENT_REGISTRY_SIZE * 4,
+    ttl=NOTION_CLIENT_IDLE_TTL,
+    max_age=WORKSPACE_CONFIG_MAX_AGE
+)
+
+def get_default_workspace():
+    """Get the deployment-wide workspace from NOTION_API_KEY / NOTION_DATABASE_ID."""
+    return NotionWorkspace(get_notion_client(), NOTION_DATABASE_ID)
+
+async def get_chat_workspace(chat_id):
+    """Get the chat's own Notion workspace, or None if it uses the default one."""
+    if chat_id is None or chat_id == '':
+        return None
+
+    config = _workspace_configs.get(str(chat_id))
+    if config is MISSING:
+        row = await get_notion_workspace(chat_id)
+        if row is None:
+            # Database error: use the default workspace without caching the result
+            return None
+        config = (row['api_key'], row['database_id']) if row else None
+        _workspace_configs.set(str(chat_id), config)
+
+    if config is None:
+        return None
+    api_key, database_id = config
+    return NotionWorkspace(get_tenant_client(api_key), database_id)
+
+async def get_chat_workspaces(chat_ids):
+    """Get the own workspace (or None) of many chats, reading uncached settings with one query."""
+    configs = {}
+    missing = []
+    for chat_id in map(str, chat_ids):
+        config = _workspace_configs.get(chat_id)
+        if config is MISSING:
+            missing.append(chat_id)
+        else:
+            configs[chat_id] = config
+
+    if missing:
+        rows = await get_notion_workspaces(missing)
+        for chat_id in missing:
+            if rows is None:
+                # Database error: use the default workspace without caching the result
+                configs[chat_id] = None
+                continue
+            row = rows.get(chat_id)
+            configs[chat_id] = (row['api_key'], row['database_id']) if row else None
+            _workspace_configs.set(chat_id, configs[chat_id])
+
+    return {
+        chat_id: NotionWorkspace(get_tenant_client(config[0]), config[1]) if config else None
+        for chat_id, config in configs.items()
+    }
+
+async def get_workspace(chat_id):
+    """Get the Notion workspace for a chat, falling back to the default one."""
+    return await get_chat_workspace(chat_id) or get_default_workspace()
+
+async def save_workspace(chat_id, api_key, database_id):
+    """Store a chat's own Notion credentials."""
+    if not await set_notion_workspace(chat_id, api_key, database_id):
+        return False
+    _workspace_configs.set(str(chat_id), (api_key, database_id))
+    return True
+
+async def remove_workspace(chat_id):
+    """Switch a chat back to the default workspace."""
+    if not await delete_notion_workspace(chat_id):
+        return False
+    _workspace_configs.set(str(chat_id), None)
+    return True
@@ -0,0 +1,78 @@
+"""Benchmark for building the notification schedule.
+
+Compares calculating every user's next notification time one by one with
+the timezone-bucketed calculation the scheduler uses, on synthetic users:
+
+    python -m mainote_bot.scheduler.benchmark --users 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+import pytz
+from mainote_bot.user_preferences import UserPreferences
+from mainote_bot.scheduler.queue import NotificationQueue
+from mainote_bot.scheduler.time_utils import next_notification_time, calculate_fire_times
+
+# Popular timezones; real user bases concentrate on a handful of them
+TIMEZONES = [
+    "Europe/Moscow", "Europe/Berlin", "Europe/London", "Asia/Yekaterinburg",
+    "Asia/Novosibirsk", "Asia/Tbilisi", "America/New_York", "America/Los_Angeles",
+    "Asia/Tokyo", "Australia/Sydney", None
+]
+
+def generate_recipients(count, seed=0):
+    """Generate synthetic (chat_id, UserPreferences) pairs with quarter-hour times."""
+    rng = random.Random(seed)
+    return [
+        (str(100000000 + i), UserPreferences(f"{rng.randint(5, 11):02d}:{rng.choice((0, 15, 30, 45)):02d}", rng.choice(TIMEZONES)))
+        for i in range(count)
+    ]
+
+def build_per_user(recipients, now):
+    """Schedule every user with their own calculation (the previous approach)."""
+    queue = NotificationQueue()
+    for chat_id, preferences in recipients:
+        queue.schedule(chat_id, next_notification_time(preferences.notification_time, preferences.timezone, now))
+    return queue
+
+def build_bucketed(recipients, now):
+    """Schedule users with one calculation per (timezone, time) bucket."""
+    queue = NotificationQueue()
+    queue.schedule_many(calculate_fire_times(recipients, now))
+    return queue
+
+def measure(build, recipients, now, repeat):
+    """Return the best wall time of ``repeat`` runs and the resulting queue."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        queue = build(recipients, now)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, queue
+
+def run(user_counts, repeat):
+    # A date close to a DST change, so both paths have to handle it
+    now = datetime(2026, 3, 28, 23, 0, tzinfo=pytz.UTC)
+    print(f"{'users':>8} {'per-user':>10} {'bucketed':>10} {'speedup':>8}")
+    for count in user_counts:
+        recipients = generate_recipients(count)
+        per_user, expected = measure(build_per_user, recipients, now, repeat)
+        bucketed, queue = measure(build_bucketed, recipients, now, repeat)
+
+        # Both approaches must produce the same schedule
+        for chat_id, _ in recipients:
+            assert queue.get(chat_id) == expected.get(chat_id), chat_id
+
+        print(f"{count:>8} {per_user * 1000:>8.1f}ms {bucketed * 1000:>8.1f}ms {per_user / bucketed:>7.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.users, args.repeat)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
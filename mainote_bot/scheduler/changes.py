@@ -0,0 +1,73 @@
+import asyncio
+import json
+from mainote_bot.utils.logging import logger
+from mainote_bot.database import connect_listener
+
+# Channel the user_preferences and blocked_chats triggers publish to
+CHANGES_CHANNEL = "scheduler_changes"
+# Seconds without notifications after which the connection is checked
+LISTENER_KEEPALIVE = 60
+# Seconds between reconnection attempts
+LISTENER_RETRY_DELAY = 5
+
+_listener_task = None
+
+async def run_change_listener(on_change, on_connected):
+    """Apply scheduler changes published by any worker until cancelled.
+
+    ``on_change(change)`` is awaited for every decoded notification.
+    ``on_connected()`` is awaited after every (re)connection, since
+    notifications sent while disconnected are lost.
+    """
+    logger.info(f"🔄 Starting scheduler change listener on {CHANGES_CHANNEL}")
+    while True:
+        conn = None
+        try:
+            conn = await connect_listener()
+            notifications = asyncio.Queue()
+            await conn.add_listener(
+                CHANGES_CHANNEL, lambda connection, pid, channel, payload: notifications.put_nowait(payload)
+            )
+            logger.info(f"Listening for scheduler changes on {CHANGES_CHANNEL}")
+            await on_connected()
+
+            while True:
+                try:
+                    payload = await asyncio.wait_for(notifications.get(), timeout=LISTENER_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Fails if the connection was dropped, which triggers a reconnect
+                    await conn.execute("SELECT 1")
+                    continue
+                try:
+                    await on_change(json.loads(payload))
+                except Exception as e:
+                    logger.error(f"Error applying scheduler change {payload}: {str(e)}", exc_info=True)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduler change listener failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(LISTENER_RETRY_DELAY)
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+
+def start_change_listener(on_change, on_connected):
+    """Start listening for scheduler changes in the main event loop."""
+    global _listener_task
+    if _listener_task is not None and not _listener_task.done():
+        logger.info("Scheduler change listener already running")
+        return
+    _listener_task = asyncio.create_task(run_change_listener(on_change, on_connected))
+
+async def stop_change_listener():
+    """Stop listening for scheduler changes."""
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+        logger.info("Scheduler change listener stopped")
\ No newline at end of file
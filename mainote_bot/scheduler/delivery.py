@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import datetime
+import pytz
+from telegram.error import RetryAfter, Forbidden
+from mainote_bot.config import (
+    TELEGRAM_RATE_LIMIT, TELEGRAM_SEND_CONCURRENCY, TELEGRAM_MAX_RETRIES, TELEGRAM_PER_CHAT_INTERVAL
+)
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.governor import RequestGovernor
+
+# Bot API flood limit across all chats (about 30 messages per second)
+telegram_governor = RequestGovernor(rate=TELEGRAM_RATE_LIMIT, burst=TELEGRAM_RATE_LIMIT, name="Telegram")
+
+# Summary of the most recent fan-out, reported by /health
+last_delivery_stats = None
+
+def get_retry_after(error):
+    """Seconds Telegram asked us to wait (int in PTB 20, timedelta in later versions)."""
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+async def send_message(bot, chat_id, text, reply_markup=None, stats=None):
+    """Send one message within the global rate limit, retrying on flood control."""
+    attempt = 0
+    while True:
+        await telegram_governor.acquire()
+        try:
+            return await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        except RetryAfter as e:
+            if attempt >= TELEGRAM_MAX_RETRIES:
+                raise
+            # Flood control applies to the whole bot, so every sender waits
+            telegram_governor.pause(get_retry_after(e))
+            attempt += 1
+            if stats is not None:
+                stats["retried"] += 1
+
+async def deliver_to_chat(bot, chat_id, messages, stats=None):
+    """Send ``(text, reply_markup)`` messages to one chat, spaced by the per-chat limit."""
+    for number, (text, reply_markup) in enumerate(messages):
+        if number:
+            await asyncio.sleep(TELEGRAM_PER_CHAT_INTERVAL)
+        await send_message(bot, chat_id, text, reply_markup, stats)
+        if stats is not None:
+            stats["messages"] += 1
+
+async def deliver_notifications(bot, recipients, on_blocked=None):
+    """Send each chat its own messages with bounded concurrency.
+
+    ``recipients`` is a list of ``(chat_id, scheduled_at, messages)`` where
+    messages are ``(text, reply_markup)`` pairs; ``scheduled_at`` (UTC, may be
+    None) is used to measure delivery lag. ``on_blocked(chat_id,
+    reason)`` is awaited for chats that blocked the bot. Returns run stats and
+    a list of ``(chat_id, status, error)`` outcomes, where status is "sent",
+    "blocked" or "failed".
+    """
+    global last_delivery_stats
+    stats = {
+        "recipients": len(recipients),
+        "sent": 0,
+        "blocked": 0,
+        "failed": 0,
+        "retried": 0,
+        "messages": 0
+    }
+    lags = []
+    outcomes = []
+    started = time.monotonic()
+    pending = iter(recipients)
+
+    async def worker():
+        # Workers share one iterator, so at most TELEGRAM_SEND_CONCURRENCY sends run at once
+        for chat_id, scheduled_at, messages in pending:
+            try:
+                await deliver_to_chat(bot, int(chat_id), messages, stats)
+                stats["sent"] += 1
+                outcomes.append((chat_id, "sent", None))
+                if scheduled_at is not None:
+                    lags.append((datetime.now(pytz.UTC) - scheduled_at).total_seconds())
+            except Forbidden as e:
+                stats["blocked"] += 1
+                outcomes.append((chat_id, "blocked", str(e)))
+                logger.warning(f"Chat ID {chat_id} blocked the bot: {str(e)}")
+                if on_blocked is not None:
+                    await on_blocked(chat_id, str(e))
+            except Exception as e:
+                stats["failed"] += 1
+                outcomes.append((chat_id, "failed", str(e)))
+                logger.error(f"Error sending notification to chat ID {chat_id}: {str(e)}", exc_info=True)
+
+    await asyncio.gather(*(worker() for _ in range(min(TELEGRAM_SEND_CONCURRENCY, len(recipients)))))
+
+    elapsed = time.monotonic() - started
+    stats["duration_seconds"] = round(elapsed, 2)
+    stats["messages_per_second"] = round(stats["messages"] / elapsed, 1) if elapsed > 0 else None
+    stats["avg_lag_seconds"] = round(sum(lags) / len(lags), 1) if lags else None
+    stats["max_lag_seconds"] = round(max(lags), 1) if lags else None
+    stats["finished_at"] = datetime.now(pytz.UTC).isoformat()
+    last_delivery_stats = stats
+
+    logger.info(
+        f"Delivered notifications to {stats['sent']} out of {stats['recipients']} chats in {stats['duration_seconds']}s "
+        f"({stats['messages_per_second']} msg/s, {stats['blocked']} blocked, {stats['failed']} failed, "
+        f"max lag {stats['max_lag_seconds']}s)"
+    )
+    return stats, outcomes
\ No newline at end of file
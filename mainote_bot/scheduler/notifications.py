@@ -1,169 +1,412 @@
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from telegram import Bot
 from mainote_bot.config import (
-    TELEGRAM_BOT_TOKEN, NOTIFICATION_CHAT_IDS, 
-    MORNING_NOTIFICATION_TIME, ENABLE_MORNING_NOTIFICATIONS
+    TELEGRAM_BOT_TOKEN, NOTIFICATION_CHAT_IDS, ENABLE_MORNING_NOTIFICATIONS, MORNING_DIGEST_MAX_TASKS,
+    MORNING_DIGEST_PAGED, NOTIFICATION_CATCH_UP_WINDOW, NOTIFICATION_LEDGER_RETENTION_DAYS, DIGEST_STAGING_LEAD,
+    DIGEST_RETRY_DELAY
 )
 from mainote_bot.utils.logging import logger
-from mainote_bot.notion.tasks import get_active_tasks, format_morning_notification
+from mainote_bot.notion.digest import digest_messages
+from mainote_bot.notion.governor import notion_priority, PRIORITY_BACKGROUND
 import mainote_bot.user_preferences as user_preferences
-from mainote_bot.scheduler.time_utils import (
-    calculate_user_notification_time, calculate_default_notification_times,
-    find_earliest_notification
+from mainote_bot.scheduler.time_utils import next_notification_time, calculate_fire_times, notification_local_date
+from mainote_bot.scheduler.queue import NotificationQueue
+from mainote_bot.scheduler.delivery import deliver_notifications
+from mainote_bot.scheduler.shards import owns_chat, start_shard_leases, stop_shard_leases
+from mainote_bot.scheduler.changes import start_change_listener, stop_change_listener
+from mainote_bot.scheduler.staging import stage_digests, take_digests, cancel_staging
+from mainote_bot.database import (
+    get_blocked_chats, set_chat_blocked, delete_chat_blocked, claim_notification_deliveries,
+    record_notification_deliveries, release_notification_deliveries, prune_notification_deliveries
 )
 
-async def send_notifications_to_users(users_to_notify):
-    """Send notifications to all users scheduled for a specific time."""
-    logger.info(f"Preparing to send notifications to {len(users_to_notify)} users: {users_to_notify}")
+async def claim_recipients(recipients):
+    """Claim today's digest in the delivery ledger for each recipient.
+
+    Returns the recipients this process may send to, each with its local
+    date, or None if the ledger is unavailable.
+    """
+    now = datetime.now(pytz.UTC)
+    local_dates = {}
+    deliveries = []
+    for chat_id, scheduled_at in recipients:
+        scheduled_at = scheduled_at or now
+        preferences = get_recipient_preferences(chat_id)
+        # Recipients firing together mostly share a bucket, so convert once per bucket
+        key = (preferences.timezone, preferences.notification_time, scheduled_at)
+        if key not in local_dates:
+            local_dates[key] = notification_local_date(scheduled_at, preferences.notification_time, preferences.timezone)
+        deliveries.append((chat_id, local_dates[key], scheduled_at))
+
+    claimed = await claim_notification_deliveries(deliveries)
+    if claimed is None:
+        return None
+    return [(chat_id, local_date, scheduled_at) for chat_id, local_date, scheduled_at in deliveries if chat_id in claimed]
+
+async def send_notifications_to_users(recipients):
+    """Send the morning digest to ``(chat_id, scheduled_at)`` recipients.
+
+    Only recipients that have not had today's digest (by their local date)
+    are sent to, whichever worker or restart sent it.
+    """
+    logger.info(f"Preparing to send notifications to {len(recipients)} users")
+
+    claimed = await claim_recipients(recipients)
+    if claimed is None:
+        # Without the ledger a send could be a duplicate; skip rather than risk it
+        logger.error(f"Delivery ledger unavailable, skipping notifications for {len(recipients)} users")
+        return None
+    if len(claimed) < len(recipients):
+        logger.info(f"Skipping {len(recipients) - len(claimed)} users who already received today's digest")
+    if not claimed:
+        return None
 
     # Create a new bot instance for this event loop
     local_bot = Bot(token=TELEGRAM_BOT_TOKEN)
-    logger.info("Created new bot instance for sending notifications")
 
-    # Get active tasks
-    tasks = await get_active_tasks()
-    logger.info(f"Found {len(tasks)} active tasks for notifications")
+    # Each chat gets its own tasks, usually staged ahead of time; chats sharing
+    # a source share one fetch and render (scheduler reads yield to user requests)
+    with notion_priority(PRIORITY_BACKGROUND):
+        digests = await take_digests(
+            [(chat_id, scheduled_at) for chat_id, _, scheduled_at in claimed], limit=MORNING_DIGEST_MAX_TASKS
+        )
 
-    # Format notification message
-    message = await format_morning_notification(tasks)
-    logger.info("Formatted notification message")
+    stats, outcomes = await deliver_notifications(
+        local_bot,
+        [
+            (chat_id, scheduled_at, digest_messages(digests[chat_id].digest_id, digests[chat_id].pages,
+                                                    paged=MORNING_DIGEST_PAGED))
+            for chat_id, _, scheduled_at in claimed if chat_id in digests
+        ],
+        on_blocked=block_recipient
+    )
 
-    # Send to all users scheduled for this time
-    notification_sent_count = 0
-    for user_id in users_to_notify:
-        try:
-            chat_id = int(user_id.strip())
-            logger.info(f"Attempting to send notification to chat ID {chat_id}...")
-            await local_bot.send_message(chat_id=chat_id, text=message)
-            logger.info(f"Successfully sent morning notification to chat ID {chat_id}")
-            notification_sent_count += 1
-        except Exception as e:
-            logger.error(f"Error sending notification to chat ID {user_id}: {str(e)}", exc_info=True)
+    # Chats whose tasks could not be fetched are not sent an empty plan; nothing
+    # was sent, so their claims are dropped and the digest is retried later
+    unavailable = [(chat_id, local_date, scheduled_at) for chat_id, local_date, scheduled_at in claimed if chat_id not in digests]
+    if unavailable:
+        logger.warning(f"Digest unavailable for {len(unavailable)} users, retrying in {DIGEST_RETRY_DELAY}s")
+        await release_notification_deliveries([(chat_id, local_date) for chat_id, local_date, _ in unavailable])
+        schedule_retries([(chat_id, scheduled_at) for chat_id, _, scheduled_at in unavailable])
+    for chat_id in digests:
+        _retry_deadlines.pop(chat_id, None)
 
-    logger.info(f"Sent notifications to {notification_sent_count} out of {len(users_to_notify)} users")
+    local_dates = {chat_id: local_date for chat_id, local_date, _ in claimed}
+    await record_notification_deliveries([
+        (chat_id, local_dates[chat_id], status, error) for chat_id, status, error in outcomes
+    ])
+    return stats
 
-async def send_morning_notification():
-    """Send morning notification with active tasks to all registered users."""
-    if not ENABLE_MORNING_NOTIFICATIONS:
-        logger.info("Morning notifications are disabled")
+# Global variable to track if scheduler is running
+scheduler_running = False
+# Next notification time of every recipient
+notification_queue = NotificationQueue()
+# In-memory snapshot of saved preferences: chat_id -> UserPreferences.
+# Loaded once, then updated one user at a time as preferences change.
+_preferences = {}
+# Chats that blocked the bot; they are not scheduled until they talk to it again
+_blocked = set()
+# Set whenever the queue changes so the scheduler re-checks its next wake-up
+_queue_changed = None
+# Notification sends still in progress
+_send_tasks = set()
+_scheduler_task = None
+# Set when shard ownership changes or the change listener reconnects; the
+# schedule is rebuilt on the next wake-up, catching up on missed times if
+# shards were gained
+_reload_requested = False
+_reload_catch_up = False
+# Whether the snapshot has been loaded (it is not until shards are owned)
+_loaded = False
+# Changes received while a load is running, re-applied on top of its result
+_changes_during_load = None
+# chat_id -> last retry time of a digest that could not be fetched, counted
+# from the notification's original time rather than the previous retry
+_retry_deadlines = {}
+
+# Longest uninterrupted sleep, so wall-clock adjustments are picked up
+MAX_SCHEDULER_SLEEP = 3600
+# How long shutdown waits for notification sends in progress
+SEND_DRAIN_TIMEOUT = 30
+
+# Stands in for a recipient whose preferences were deleted after they were queued
+NO_PREFERENCES = user_preferences.UserPreferences(None, None)
+
+def get_recipient_preferences(chat_id):
+    """Get the preferences a recipient is scheduled with."""
+    return _preferences.get(chat_id, NO_PREFERENCES)
+
+def schedule_user(chat_id, preferences, after):
+    """Queue a recipient's next notification after ``after``, or remove them if they have no time set.
+
+    Recipients in shards owned by another worker are left to that worker.
+    """
+    if not preferences.notification_time or not owns_chat(chat_id):
+        unschedule_user(chat_id)
         return
+    try:
+        fire_at = next_notification_time(preferences.notification_time, preferences.timezone, after)
+    except Exception as e:
+        logger.error(f"Error calculating notification time for chat ID {chat_id}: {str(e)}", exc_info=True)
+        unschedule_user(chat_id)
+        return
+    notification_queue.schedule(chat_id, fire_at)
+    if _queue_changed is not None:
+        _queue_changed.set()
+
+def schedule_retries(recipients):
+    """Queue ``(chat_id, scheduled_at)`` recipients again after DIGEST_RETRY_DELAY.
+
+    The retry replaces the next regular notification, which is queued again
+    once the retry fires. Recipients are retried until NOTIFICATION_CATCH_UP_WINDOW
+    after their original notification time.
+    """
+    now = datetime.now(pytz.UTC)
+    retry_at = now + timedelta(seconds=DIGEST_RETRY_DELAY)
+    for chat_id, scheduled_at in recipients:
+        deadline = _retry_deadlines.pop(chat_id, None) or (scheduled_at or now) + timedelta(seconds=NOTIFICATION_CATCH_UP_WINDOW)
+        if not _loaded or chat_id in _blocked or not owns_chat(chat_id) or retry_at > deadline:
+            continue
+        _retry_deadlines[chat_id] = deadline
+        notification_queue.schedule(chat_id, retry_at)
+    if _queue_changed is not None:
+        _queue_changed.set()
+
+def unschedule_user(chat_id):
+    """Remove a recipient from the queue."""
+    notification_queue.remove(chat_id)
+    if _queue_changed is not None:
+        _queue_changed.set()
+
+async def load_notification_schedule(now, catch_up=True):
+    """Load every user's preferences with one query and build the queue of this worker's shards."""
+    preferences = await user_preferences.get_all_preferences()
+    if preferences is None:
+        raise RuntimeError("Could not load user preferences")
+    blocked = await get_blocked_chats()
+    if blocked is None:
+        raise RuntimeError("Could not load blocked chats")
+    await prune_notification_deliveries(NOTIFICATION_LEDGER_RETENTION_DAYS)
+
+    _preferences.clear()
+    _preferences.update(preferences)
+    _blocked.clear()
+    _blocked.update(blocked)
 
-    if not NOTIFICATION_CHAT_IDS or NOTIFICATION_CHAT_IDS == ['']:
-        logger.warning("No chat IDs configured for morning notifications")
+    # The database is the only source of recipients
+    recipients = [
+        (chat_id, prefs) for chat_id, prefs in _preferences.items()
+        if chat_id not in _blocked and owns_chat(chat_id)
+    ]
+    missing = NOTIFICATION_CHAT_IDS.difference(_preferences)
+    if missing:
+        logger.warning(
+            f"{len(missing)} chats in NOTIFICATION_CHAT_IDS have no saved preferences and are not notified; "
+            f"run python -m mainote_bot.import_preferences to add them"
+        )
+
+    # Times missed within the catch-up window (e.g. during a deploy or while a
+    # dead worker's shards were unowned) are due right away; the delivery
+    # ledger skips users who already got today's digest
+    after = now - timedelta(seconds=NOTIFICATION_CATCH_UP_WINDOW) if catch_up else now
+    notification_queue.clear()
+    _retry_deadlines.clear()
+    notification_queue.schedule_many(calculate_fire_times(recipients, after))
+    if _queue_changed is not None:
+        _queue_changed.set()
+
+    logger.info(
+        f"Loaded preferences of {len(_preferences)} users ({len(_blocked)} blocked the bot), "
+        f"scheduled morning notifications for {len(notification_queue)} recipients"
+    )
+
+async def reschedule_user(chat_id, **changes):
+    """Apply a user's preference change to the snapshot and move their queue entry.
+
+    ``changes`` are the UserPreferences fields that were just saved. Users
+    missing from the snapshot are read from the database once.
+    """
+    if not scheduler_running:
         return
+    chat_id = str(chat_id)
+    preferences = _preferences.get(chat_id)
+    if preferences is None:
+        preferences = await user_preferences.get_preferences(chat_id) or user_preferences.UserPreferences(None, None)
+    preferences = preferences._replace(**changes)
+    _preferences[chat_id] = preferences
 
-    try:
-        # Get active tasks
-        tasks = await get_active_tasks()
+    # Changing settings means the user is talking to the bot again
+    if chat_id in _blocked:
+        await unblock_recipient(chat_id)
+        return
+
+    schedule_user(chat_id, preferences, datetime.now(pytz.UTC))
+    fire_at = notification_queue.get(chat_id)
+    if fire_at is not None:
+        logger.info(f"Rescheduled chat ID {chat_id} for {fire_at.strftime('%Y-%m-%d %H:%M:%S')} UTC")
 
-        # Format notification message
-        message = await format_morning_notification(tasks)
+async def block_recipient(chat_id, reason):
+    """Stop scheduling a chat that blocked the bot."""
+    chat_id = str(chat_id)
+    _blocked.add(chat_id)
+    unschedule_user(chat_id)
+    await set_chat_blocked(chat_id, reason)
 
-        # Create a new bot instance for this event loop
-        local_bot = Bot(token=TELEGRAM_BOT_TOKEN)
+async def unblock_recipient(chat_id):
+    """Resume notifications for a chat that had blocked the bot."""
+    chat_id = str(chat_id)
+    if chat_id not in _blocked:
+        return
+    _blocked.discard(chat_id)
+    await delete_chat_blocked(chat_id)
+    if scheduler_running and chat_id in _preferences:
+        schedule_user(chat_id, get_recipient_preferences(chat_id), datetime.now(pytz.UTC))
+    logger.info(f"Chat ID {chat_id} is reachable again, resumed notifications")
 
-        # Send to all configured chat IDs
-        for chat_id in NOTIFICATION_CHAT_IDS:
-            if not chat_id:
-                continue
+def request_schedule_reload(catch_up=False):
+    """Rebuild the queue on the scheduler's next wake-up."""
+    global _reload_requested, _reload_catch_up
+    _reload_requested = True
+    _reload_catch_up = _reload_catch_up or catch_up
+    if _queue_changed is not None:
+        _queue_changed.set()
 
-            try:
-                chat_id = int(chat_id.strip())
-                await local_bot.send_message(chat_id=chat_id, text=message)
-                logger.info(f"Sent morning notification to chat ID {chat_id}")
-            except Exception as e:
-                logger.error(f"Error sending notification to chat ID {chat_id}: {str(e)}", exc_info=True)
+async def on_shards_changed(gained):
+    """Rebuild the queue for the shards this worker now owns."""
+    request_schedule_reload(catch_up=gained)
 
-    except Exception as e:
-        logger.error(f"Error in send_morning_notification: {str(e)}", exc_info=True)
+def refresh_recipient(chat_id):
+    """Reschedule a chat from the snapshot after its preferences or blocked state changed."""
+    if chat_id in _blocked or chat_id not in _preferences:
+        unschedule_user(chat_id)
+        return
+    schedule_user(chat_id, get_recipient_preferences(chat_id), datetime.now(pytz.UTC))
 
-# Global variable to track if scheduler is running
-scheduler_running = False
-# Global variable to track the last preference check time
-last_preference_check = None
-# Global variable to force recalculation
-force_recalculation = False
+async def apply_scheduler_change(change, replay=False):
+    """Apply a user_preferences or blocked_chats change published by any worker.
 
-def force_notification_recalculation():
-    """Force the scheduler to recalculate notification times."""
-    global force_recalculation
-    force_recalculation = True
-    logger.info("Forcing notification time recalculation")
+    Changes are applied to the snapshot incrementally; the worker that made
+    the change receives it too, which is harmless since applying it is
+    idempotent. ``replay`` marks changes re-applied after a load, which are
+    no longer the latest and must not touch the preference cache.
+    """
+    if _changes_during_load is not None:
+        _changes_during_load.append(change)
+    if change["op"] == "RELOAD":
+        # Bulk imports publish one notification instead of one per row
+        if not replay:
+            user_preferences.clear_preferences_cache()
+        if _loaded:
+            request_schedule_reload()
+        return
+    chat_id = change["chat_id"]
+    if change["table"] == "user_preferences":
+        preferences = None
+        if change["op"] != "DELETE":
+            preferences = user_preferences.UserPreferences(change["notification_time"], change["timezone"])
+        # Keep this worker's read cache in step with changes made on other
+        # workers, also while the schedule is not loaded
+        if not replay:
+            user_preferences.cache_preferences(chat_id, preferences)
+    if not _loaded:
+        return
+    if change["table"] == "user_preferences":
+        if preferences is None:
+            _preferences.pop(chat_id, None)
+        else:
+            _preferences[chat_id] = preferences
+    elif change["table"] == "blocked_chats":
+        if change["op"] == "DELETE":
+            _blocked.discard(chat_id)
+        else:
+            _blocked.add(chat_id)
+    else:
+        return
+    refresh_recipient(chat_id)
+
+async def on_change_listener_connected():
+    """Reload the snapshot, as changes published while disconnected were missed."""
+    if _loaded:
+        request_schedule_reload()
+
+async def reload_notification_schedule(now):
+    """Rebuild the queue if it was requested."""
+    global _reload_requested, _reload_catch_up, _loaded, _changes_during_load
+    if not _reload_requested:
+        return
+    catch_up = _reload_catch_up
+    _reload_requested = _reload_catch_up = False
+    _changes_during_load = []
+    try:
+        await load_notification_schedule(now, catch_up)
+    except Exception:
+        request_schedule_reload(catch_up)
+        raise
+    finally:
+        changes, _changes_during_load = _changes_during_load, None
+    _loaded = True
+
+    # The load may have read rows from before these changes
+    for change in changes:
+        await apply_scheduler_change(change, replay=True)
+
+def fire_due_notifications(now):
+    """Start sending to every recipient whose notification time has come."""
+    due = notification_queue.pop_due(now)
+    if not due:
+        return
+
+    # Queue each recipient's next notification before sending, so a slow
+    # send never delays the schedule or fires the same time twice
+    notification_queue.schedule_many(calculate_fire_times(
+        ((chat_id, get_recipient_preferences(chat_id)) for chat_id, _ in due), now
+    ))
+
+    task = asyncio.create_task(send_notifications_to_users(due))
+    _send_tasks.add(task)
+    task.add_done_callback(_send_tasks.discard)
+
+def stage_upcoming_digests(now):
+    """Start staging the digests of recipients due within DIGEST_STAGING_LEAD.
+
+    Returns when the next recipient enters the staging window, or None.
+    """
+    if DIGEST_STAGING_LEAD <= 0:
+        return None
+    lead = timedelta(seconds=DIGEST_STAGING_LEAD)
+    upcoming, next_after = notification_queue.scan(now + lead)
+    stage_digests(upcoming, now, limit=MORNING_DIGEST_MAX_TASKS)
+    return next_after - lead if next_after is not None else None
 
 async def schedule_morning_notifications():
-    """Schedule the morning notifications to run daily."""
-    global last_preference_check, force_recalculation
+    """Send morning notifications, sleeping until the next recipient is due."""
     logger.info("🔄 Starting morning notification scheduler loop")
-    
+
     while True:
         try:
-            # Get current time in UTC
+            _queue_changed.clear()
+            await reload_notification_schedule(datetime.now(pytz.UTC))
             now = datetime.now(pytz.UTC)
-            
-            # Check if we need to recalculate (every 5 minutes or if forced)
-            should_recalculate = (
-                last_preference_check is None or
-                (now - last_preference_check).total_seconds() >= 300 or  # 5 minutes
-                force_recalculation
-            )
-            
-            if should_recalculate:
-                logger.info(f"Recalculating notification times (forced: {force_recalculation})")
-                last_preference_check = now
-                force_recalculation = False
-                
-                # Get all users with preferences
-                users_with_prefs = await user_preferences.get_all_users_with_preferences()
-                logger.info(f"Found {len(users_with_prefs)} users with preferences: {list(users_with_prefs)}")
-
-                # Dictionary to store next notification time for each user
-                next_notifications = {}
-
-                # Calculate next notification time for each user with custom preferences
-                for user_id in users_with_prefs:
-                    user_time = await user_preferences.get_user_notification_time(user_id)
-                    user_timezone_str = await user_preferences.get_user_timezone(user_id)
-
-                    if user_time:
-                        notification_info = await calculate_user_notification_time(user_id, user_time, user_timezone_str, now)
-                        if notification_info:
-                            next_notifications[user_id] = notification_info
-
-                # For users without custom preferences, use the default time
-                default_users = [chat_id for chat_id in NOTIFICATION_CHAT_IDS if chat_id and chat_id not in users_with_prefs]
-                default_notifications = calculate_default_notification_times(default_users, now, MORNING_NOTIFICATION_TIME)
-                next_notifications.update(default_notifications)
-
-                # Find the earliest notification time
-                _, next_time, seconds_until_next = find_earliest_notification(next_notifications)
-
-                if next_time:
-                    logger.info(f"Next notification scheduled for {next_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-                    
-                    # Wait until the next notification time or until next preference check
-                    wait_time = min(seconds_until_next, 60)  # Wait at most 1 minute
-                    await asyncio.sleep(wait_time)
-                    
-                    # If we've reached the notification time
-                    if wait_time == seconds_until_next:
-                        current_time = datetime.now(pytz.UTC)
-                        logger.info(f"Notification time reached! Current time: {current_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-
-                        # Send notifications to all users scheduled for this time
-                        users_to_notify = [user_id for user_id in next_notifications 
-                                          if abs(next_notifications[user_id]['seconds'] - seconds_until_next) < 60]  # Within 1 minute
-
-                        await send_notifications_to_users(users_to_notify)
-                else:
-                    # If no users to notify, wait for next preference check
-                    logger.info("No users to notify. Checking again in 1 minute.")
-                    await asyncio.sleep(60)  # 1 minute
+            fire_due_notifications(now)
+            stage_at = stage_upcoming_digests(now)
 
+            next_time = notification_queue.peek()
+            if next_time is not None:
+                logger.info(f"Next notification scheduled for {next_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+                timeout = min(max(0.0, (next_time - now).total_seconds()), MAX_SCHEDULER_SLEEP)
             else:
-                # If no recalculation needed, wait a bit before checking again
-                await asyncio.sleep(60)  # Check every minute
+                logger.info("No users to notify")
+                timeout = MAX_SCHEDULER_SLEEP
+            if stage_at is not None:
+                timeout = min(timeout, max(0.0, (stage_at - now).total_seconds()))
+
+            # Sleep until the next entry is due or the queue changes
+            try:
+                await asyncio.wait_for(_queue_changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
         except Exception as e:
             logger.error(f"Error in schedule_morning_notifications: {str(e)}", exc_info=True)
@@ -172,22 +415,49 @@ async def schedule_morning_notifications():
 
 def start_scheduler():
     """Start the scheduler in the main event loop."""
-    global scheduler_running
+    global scheduler_running, _queue_changed, _scheduler_task
     try:
         if scheduler_running:
             logger.info("Scheduler already running")
             return
 
         if ENABLE_MORNING_NOTIFICATIONS:
-            logger.info(
-                f"Starting morning notification scheduler (time: {MORNING_NOTIFICATION_TIME}, recipients: {NOTIFICATION_CHAT_IDS})"
-            )
+            logger.info("Starting morning notification scheduler")
 
             # Create the scheduler task
-            asyncio.create_task(schedule_morning_notifications())
+            _queue_changed = asyncio.Event()
+            _scheduler_task = asyncio.create_task(schedule_morning_notifications())
+            # Preference changes made on any worker are pushed by the database
+            start_change_listener(apply_scheduler_change, on_change_listener_connected)
+            # Recipients are scheduled once this worker leases some shards
+            start_shard_leases(on_shards_changed)
             scheduler_running = True
             logger.info("Scheduler task created and started")
         else:
             logger.info("Morning notifications are disabled")
     except Exception as e:
-        logger.error(f"Error starting scheduler: {str(e)}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Error starting scheduler: {str(e)}", exc_info=True)
+
+async def stop_scheduler():
+    """Stop the scheduler and hand this worker's shards to the others."""
+    global scheduler_running, _scheduler_task
+    if not scheduler_running:
+        return
+    scheduler_running = False
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
+
+    # Let sends in progress finish so their ledger rows are recorded
+    if _send_tasks:
+        await asyncio.wait(set(_send_tasks), timeout=SEND_DRAIN_TIMEOUT)
+    cancel_staging()
+    await stop_change_listener()
+    await stop_shard_leases()
+    notification_queue.clear()
+    _retry_deadlines.clear()
+    logger.info("Scheduler stopped")
\ No newline at end of file
@@ -0,0 +1,119 @@
+import heapq
+import itertools
+
+class NotificationQueue:
+    """Priority queue of the next notification time of every user.
+
+    Each user has at most one live entry. Rescheduling or removing a user
+    marks the old heap entry as dead instead of searching for it, so every
+    update costs O(log n); dead entries are skipped when they reach the top
+    and the heap is rebuilt when they make up most of it.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, chat_id):
+        return chat_id in self._entries
+
+    def _discard(self, chat_id):
+        entry = self._entries.pop(chat_id, None)
+        if entry is not None:
+            entry[-1] = None
+            self._dead += 1
+
+    def _compact(self):
+        if self._dead > len(self._entries) and self._dead > 64:
+            self._heap = [entry for entry in self._heap if entry[-1] is not None]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def schedule(self, chat_id, fire_at):
+        """Set (or move) a user's next notification time (UTC datetime)."""
+        self._discard(chat_id)
+        entry = [fire_at, next(self._sequence), chat_id]
+        self._entries[chat_id] = entry
+        heapq.heappush(self._heap, entry)
+        self._compact()
+
+    def schedule_many(self, fire_times):
+        """Set the next notification time of many users from ``(fire_at, chat_ids)`` pairs."""
+        added = []
+        for fire_at, chat_ids in fire_times:
+            for chat_id in chat_ids:
+                self._discard(chat_id)
+                entry = [fire_at, next(self._sequence), chat_id]
+                self._entries[chat_id] = entry
+                added.append(entry)
+
+        # Rebuilding the heap in one go is cheaper than pushing a large batch
+        if len(added) > len(self._heap):
+            self._heap.extend(added)
+            heapq.heapify(self._heap)
+        else:
+            for entry in added:
+                heapq.heappush(self._heap, entry)
+        self._compact()
+
+    def remove(self, chat_id):
+        """Stop notifying a user."""
+        self._discard(chat_id)
+        self._compact()
+
+    def get(self, chat_id):
+        """Get a user's next notification time, or None."""
+        entry = self._entries.get(chat_id)
+        return entry[0] if entry is not None else None
+
+    def peek(self):
+        """Get the earliest notification time, or None if the queue is empty."""
+        while self._heap and self._heap[0][-1] is None:
+            heapq.heappop(self._heap)
+            self._dead -= 1
+        return self._heap[0][0] if self._heap else None
+
+    def scan(self, until):
+        """List ``(chat_id, fire_at)`` of entries due at or before ``until`` without removing them.
+
+        Children in the heap fire no earlier than their parent, so only the
+        part of the heap holding these entries is visited. Also returns the
+        earliest fire time after ``until``, or None.
+        """
+        due = []
+        next_after = None
+        stack = [0] if self._heap else []
+        while stack:
+            index = stack.pop()
+            fire_at, _, chat_id = self._heap[index]
+            if fire_at > until and chat_id is not None:
+                if next_after is None or fire_at < next_after:
+                    next_after = fire_at
+                continue
+            if chat_id is not None:
+                due.append((chat_id, fire_at))
+            # Dead entries are descended into too, their children may be live
+            stack.extend(child for child in (2 * index + 1, 2 * index + 2) if child < len(self._heap))
+        return due, next_after
+
+    def pop_due(self, now):
+        """Remove and return ``(chat_id, fire_at)`` for every entry due at or before ``now``."""
+        due = []
+        while True:
+            fire_at = self.peek()
+            if fire_at is None or fire_at > now:
+                return due
+            _, _, chat_id = heapq.heappop(self._heap)
+            del self._entries[chat_id]
+            due.append((chat_id, fire_at))
+
+    def clear(self):
+        """Remove every entry."""
+        self._heap = []
+        self._entries = {}
+        self._dead = 0
\ No newline at end of file
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import socket
+import time
+import zlib
+from mainote_bot.config import SCHEDULER_SHARDS, SCHEDULER_LEASE_TTL, SCHEDULER_HEARTBEAT_INTERVAL
+from mainote_bot.utils.logging import logger
+from mainote_bot.database import (
+    register_scheduler_shards, heartbeat_scheduler_worker, remove_scheduler_worker,
+    renew_shard_leases, acquire_shard_leases, release_shard_leases
+)
+
+# Identifies this process in the lease tables
+WORKER_ID = f"{os.getenv('FLY_MACHINE_ID') or socket.gethostname()}:{os.getpid()}"
+
+# Shards this worker holds a lease on; only their chats are scheduled here
+owned_shards = set()
+# Monotonic time until which the last renewed leases are valid
+_lease_deadline = 0.0
+_lease_task = None
+
+def shard_of(chat_id):
+    """Get the shard of a chat ID (stable across processes, unlike hash())."""
+    return zlib.crc32(str(chat_id).encode()) % SCHEDULER_SHARDS
+
+def owns_chat(chat_id):
+    """Whether this worker schedules the chat."""
+    return shard_of(chat_id) in owned_shards
+
+async def balance_shard_leases():
+    """Renew this worker's leases and move towards a fair share of the shards.
+
+    Each worker aims for ceil(shards / live workers): it gives up extra shards
+    so new workers can take them and takes free or expired ones, which is how
+    a dead worker's shards are taken over. Returns True if ownership changed.
+    """
+    global _lease_deadline
+    before = set(owned_shards)
+
+    workers = await heartbeat_scheduler_worker(WORKER_ID, SCHEDULER_LEASE_TTL)
+    renewed = await renew_shard_leases(WORKER_ID, owned_shards, SCHEDULER_LEASE_TTL) if owned_shards else set()
+    if workers is None or renewed is None:
+        # Another worker may take our shards once the leases run out, so stop
+        # scheduling them before that rather than risk two owners
+        if owned_shards and time.monotonic() >= _lease_deadline - SCHEDULER_HEARTBEAT_INTERVAL:
+            logger.warning(f"Could not renew scheduler shard leases, giving up {len(owned_shards)} shards")
+            owned_shards.clear()
+        return owned_shards != before
+
+    _lease_deadline = time.monotonic() + SCHEDULER_LEASE_TTL
+    owned_shards.intersection_update(renewed)
+
+    fair_share = -(-SCHEDULER_SHARDS // workers)
+    if len(owned_shards) > fair_share:
+        extra = sorted(owned_shards)[fair_share:]
+        if await release_shard_leases(WORKER_ID, extra):
+            owned_shards.difference_update(extra)
+    elif len(owned_shards) < fair_share:
+        acquired = await acquire_shard_leases(WORKER_ID, SCHEDULER_SHARDS, fair_share - len(owned_shards), SCHEDULER_LEASE_TTL)
+        owned_shards.update(acquired or ())
+
+    if owned_shards != before:
+        logger.info(
+            f"Scheduler worker {WORKER_ID} owns {len(owned_shards)} of {SCHEDULER_SHARDS} shards "
+            f"({workers} live workers): {sorted(owned_shards)}"
+        )
+    return owned_shards != before
+
+async def run_shard_leases(on_change):
+    """Heartbeat the shard leases until cancelled, awaiting ``on_change(gained)`` when ownership changes."""
+    logger.info(f"🔄 Starting scheduler shard leases for worker {WORKER_ID}")
+    while not await register_scheduler_shards(SCHEDULER_SHARDS):
+        await asyncio.sleep(SCHEDULER_HEARTBEAT_INTERVAL)
+
+    while True:
+        try:
+            before = set(owned_shards)
+            if await balance_shard_leases():
+                await on_change(bool(owned_shards - before))
+        except Exception as e:
+            logger.error(f"Error in scheduler shard heartbeat: {str(e)}", exc_info=True)
+        await asyncio.sleep(SCHEDULER_HEARTBEAT_INTERVAL)
+
+def start_shard_leases(on_change):
+    """Start the shard heartbeat in the main event loop."""
+    global _lease_task
+    if _lease_task is not None and not _lease_task.done():
+        logger.info("Scheduler shard leases already running")
+        return
+    _lease_task = asyncio.create_task(run_shard_leases(on_change))
+
+async def stop_shard_leases():
+    """Stop the heartbeat and hand this worker's shards over right away."""
+    global _lease_task
+    if _lease_task is not None:
+        _lease_task.cancel()
+        try:
+            await _lease_task
+        except asyncio.CancelledError:
+            pass
+        _lease_task = None
+    if owned_shards:
+        await release_shard_leases(WORKER_ID, owned_shards)
+        logger.info(f"Released {len(owned_shards)} scheduler shards")
+        owned_shards.clear()
+    await remove_scheduler_worker(WORKER_ID)
+
+def shard_stats():
+    """Shard ownership of this worker, for /health."""
+    return {
+        "worker_id": WORKER_ID,
+        "shards": SCHEDULER_SHARDS,
+        "owned_shards": sorted(owned_shards)
+    }
\ No newline at end of file
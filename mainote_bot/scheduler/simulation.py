@@ -0,0 +1,335 @@
+"""Virtual-clock simulation of the morning notification scheduler.
+
+Runs the scheduler in notifications.py against a virtual clock for a number
+of simulated days, with a synthetic population and in-memory stand-ins for
+Postgres (preferences, delivery ledger) and Telegram, then checks every send
+against an independent zoneinfo calculation:
+
+    python -m mainote_bot.scheduler.simulation --users 100000 --days 3 --start 2026-03-27
+
+Reports schedule calculation CPU time, memory, fire-time jitter and missed
+or duplicate sends. The default start covers the European DST change.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, available_timezones
+import pytz
+from mainote_bot.utils.logging import logger
+from mainote_bot.user_preferences import UserPreferences
+from mainote_bot.notion.digest import ChatDigest
+from mainote_bot.notion.governor import RequestGovernor
+from mainote_bot.scheduler.time_utils import group_recipients
+import mainote_bot.scheduler.notifications as notifications
+import mainote_bot.scheduler.delivery as delivery
+import mainote_bot.scheduler.shards as shards
+import mainote_bot.user_preferences as user_preferences
+
+# Sends further than this from any expected send count as unexpected
+MAX_JITTER = timedelta(hours=6)
+
+# Zones both pytz (used by the scheduler) and zoneinfo (used to check it) know
+TIMEZONES = sorted(set(pytz.all_timezones) & available_timezones())
+
+class VirtualClock:
+    """Current simulated time (aware UTC datetime)."""
+
+    def __init__(self, now):
+        self.now = now
+
+def virtual_datetime(clock):
+    """A datetime class whose now() reads the virtual clock."""
+    class VirtualDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.now.astimezone(tz) if tz is not None else clock.now.replace(tzinfo=None)
+    return VirtualDatetime
+
+class FakeBot:
+    """Telegram stand-in recording every message with the virtual send time."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((str(chat_id), self.clock.now))
+
+class MemoryDatabase:
+    """Stand-in for the preference, blocked chat and delivery ledger tables."""
+
+    def __init__(self, preferences):
+        self.preferences = dict(preferences)
+        self.ledger = set()
+
+    async def get_all_preferences(self):
+        return dict(self.preferences)
+
+    async def get_blocked_chats(self):
+        return set()
+
+    async def prune_notification_deliveries(self, keep_days):
+        pass
+
+    async def claim_notification_deliveries(self, deliveries):
+        claimed = set()
+        for chat_id, local_date, _ in deliveries:
+            if (chat_id, local_date) not in self.ledger:
+                self.ledger.add((chat_id, local_date))
+                claimed.add(chat_id)
+        return claimed
+
+    async def record_notification_deliveries(self, results):
+        pass
+
+    async def release_notification_deliveries(self, deliveries):
+        self.ledger.difference_update(deliveries)
+
+def flaky_digests(failure_rate, seed):
+    """Digest stand-in: every recipient gets the same one-page digest, except
+    that a ``failure_rate`` share of fetches fail."""
+    rng = random.Random(seed)
+
+    async def take_digests(recipients, limit=None):
+        return {
+            chat_id: ChatDigest(None, 0, None, ["digest"]) for chat_id, _ in recipients
+            if rng.random() >= failure_rate
+        }
+    return take_digests
+
+def install_stand_ins(clock, database, bot, take_digests):
+    """Point the scheduler at the virtual clock and the in-memory stand-ins."""
+    notifications.datetime = virtual_datetime(clock)
+    delivery.datetime = virtual_datetime(clock)
+    notifications.Bot = lambda token: bot
+    notifications.take_digests = take_digests
+    notifications.get_blocked_chats = database.get_blocked_chats
+    notifications.prune_notification_deliveries = database.prune_notification_deliveries
+    notifications.claim_notification_deliveries = database.claim_notification_deliveries
+    notifications.record_notification_deliveries = database.record_notification_deliveries
+    notifications.release_notification_deliveries = database.release_notification_deliveries
+    user_preferences.get_all_preferences = database.get_all_preferences
+    # Telegram rate limits are real-time and out of scope here
+    delivery.telegram_governor = RequestGovernor(rate=1e9, burst=1e9, name="Simulation")
+    # This process owns every shard
+    shards.owned_shards.update(range(shards.SCHEDULER_SHARDS))
+
+def agreeing_timezones(start, end):
+    """Zones whose UTC offsets pytz and zoneinfo agree on around the simulated period.
+
+    The two ship separate copies of the tz database; where they disagree the
+    check below would report the data difference rather than the scheduler.
+    """
+    hours = int((end - start).total_seconds() // 3600) + 48
+    instants = [start - timedelta(hours=24) + timedelta(hours=hour) for hour in range(hours)]
+    return [
+        timezone_str for timezone_str in TIMEZONES
+        if all(
+            instant.astimezone(pytz.timezone(timezone_str)).utcoffset() == instant.astimezone(ZoneInfo(timezone_str)).utcoffset()
+            for instant in instants
+        )
+    ]
+
+def generate_population(count, timezones, seed=0):
+    """Generate chat_id -> UserPreferences with random zones and minute-precision times."""
+    rng = random.Random(seed)
+    return {
+        str(100000000 + i): UserPreferences(f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}", rng.choice(timezones))
+        for i in range(count)
+    }
+
+def generate_changes(preferences, start, end, per_day, seed=0):
+    """Generate time-sorted ``(at, chat_id, new_time)`` notification time changes."""
+    rng = random.Random(seed + 1)
+    chat_ids = list(preferences)
+    span = (end - start).total_seconds()
+    count = int(per_day * span / 86400)
+    return sorted(
+        (start + timedelta(seconds=rng.uniform(0, span)), rng.choice(chat_ids),
+         f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}")
+        for _ in range(count)
+    )
+
+def expected_instant(local_date, user_time, zone):
+    """UTC instant of a local time, calculated with zoneinfo.
+
+    Follows the scheduler's pytz convention: skipped times (DST gap) use the
+    offset from before the change, repeated times use the second occurrence.
+    """
+    hour, minute = map(int, user_time.split(':'))
+    first = datetime(local_date.year, local_date.month, local_date.day, hour, minute, tzinfo=zone)
+    second = first.replace(fold=1)
+    repeated = first.utcoffset() > second.utcoffset()
+    return (second if repeated else first).astimezone(pytz.UTC)
+
+def expected_sends(preferences, changes, start, end):
+    """Calculate which (chat_id, local_date) should be sent, and when.
+
+    A user's time for a local date counts while that time was their
+    preference; the ledger allows one send per local date, so the first
+    matching instant wins.
+    """
+    history = defaultdict(list)
+    for chat_id, prefs in preferences.items():
+        history[chat_id].append((start, prefs.notification_time))
+    for at, chat_id, user_time in changes:
+        history[chat_id].append((at, user_time))
+
+    zones = {}
+    expected = {}
+    for chat_id, segments in history.items():
+        timezone_str = preferences[chat_id].timezone
+        zone = zones.setdefault(timezone_str, ZoneInfo(timezone_str))
+        local_date = start.astimezone(zone).date() - timedelta(days=1)
+        last_date = end.astimezone(zone).date() + timedelta(days=1)
+        while local_date <= last_date:
+            for number, (since, user_time) in enumerate(segments):
+                until = segments[number + 1][0] if number + 1 < len(segments) else end
+                instant = expected_instant(local_date, user_time, zone)
+                if since < instant <= until and start < instant <= end:
+                    expected[(chat_id, local_date)] = instant
+                    break
+            local_date += timedelta(days=1)
+    return expected
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+async def simulate(preferences, changes, start, end, digest_failures, seed):
+    """Run the scheduler from ``start`` to ``end`` and return measurements and sends."""
+    clock = VirtualClock(start)
+    database = MemoryDatabase(preferences)
+    bot = FakeBot(clock)
+    install_stand_ins(clock, database, bot, flaky_digests(digest_failures, seed))
+
+    # Cold (first) and warm (reload after reconnect) schedule builds, then one
+    # traced build: what it allocates and keeps is the snapshot and the queue
+    load_cpu = []
+    for _ in range(2):
+        started = time.process_time()
+        notifications.request_schedule_reload()
+        await notifications.reload_notification_schedule(clock.now)
+        load_cpu.append(time.process_time() - started)
+    tracemalloc.start()
+    notifications.request_schedule_reload()
+    await notifications.reload_notification_schedule(clock.now)
+    memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    fires = 0
+    reschedule_cpu = []
+    pending_changes = deque(changes)
+    while True:
+        next_time = notifications.notification_queue.peek()
+        if pending_changes and (next_time is None or pending_changes[0][0] < next_time) and pending_changes[0][0] <= end:
+            at, chat_id, user_time = pending_changes.popleft()
+            clock.now = at
+            database.preferences[chat_id] = database.preferences[chat_id]._replace(notification_time=user_time)
+            await notifications.apply_scheduler_change({
+                "table": "user_preferences", "op": "UPDATE", "chat_id": chat_id,
+                "notification_time": user_time, "timezone": preferences[chat_id].timezone
+            })
+            continue
+        if next_time is None or next_time > end:
+            break
+
+        clock.now = next_time
+        started = time.process_time()
+        notifications.fire_due_notifications(clock.now)
+        reschedule_cpu.append(time.process_time() - started)
+        fires += 1
+        # Sends finish before the clock moves on
+        await asyncio.gather(*list(notifications._send_tasks))
+
+    return {
+        "load_cpu": load_cpu,
+        "memory": memory,
+        "peak_memory": peak_memory,
+        "fires": fires,
+        "reschedule_cpu": reschedule_cpu,
+        "sent": bot.sent
+    }
+
+def check_sends(sent, expected):
+    """Compare actual sends with the expected ones.
+
+    Each send is attributed to the user's nearest expected send (the local
+    date of the send itself can differ, e.g. after a DST gap at midnight);
+    sends more than MAX_JITTER away from any are unexpected.
+    """
+    expected_by_chat = defaultdict(list)
+    for (chat_id, local_date), instant in expected.items():
+        expected_by_chat[chat_id].append((instant, local_date))
+
+    seen = defaultdict(list)
+    unexpected = []
+    jitter = []
+    for chat_id, at in sent:
+        nearest = min(expected_by_chat[chat_id], key=lambda item: abs(item[0] - at), default=None)
+        if nearest is None or abs(nearest[0] - at) > MAX_JITTER:
+            unexpected.append((chat_id, at))
+            continue
+        seen[(chat_id, nearest[1])].append(at)
+        jitter.append(abs((nearest[0] - at).total_seconds()))
+
+    duplicates = sum(len(times) - 1 for times in seen.values())
+    missed = [key for key in expected if key not in seen]
+    return duplicates, unexpected, missed, sorted(jitter)
+
+def run(users, days, start, changes_per_day, digest_failures, seed):
+    start = pytz.UTC.localize(datetime.fromisoformat(start))
+    end = start + timedelta(days=days)
+    timezones = agreeing_timezones(start, end)
+    preferences = generate_population(users, timezones, seed)
+    changes = generate_changes(preferences, start, end, changes_per_day, seed)
+    buckets = len(group_recipients(preferences.items()))
+    print(f"{users} users in {len(timezones)} timezones ({buckets} time buckets), "
+          f"{len(changes)} time changes, {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} UTC")
+    if len(timezones) < len(TIMEZONES):
+        print(f"skipped {len(TIMEZONES) - len(timezones)} timezones where pytz and the system tz database disagree")
+
+    result = asyncio.run(simulate(preferences, changes, start, end, digest_failures, seed))
+    expected = expected_sends(preferences, changes, start, end)
+    duplicates, unexpected, missed, jitter = check_sends(result["sent"], expected)
+
+    reschedule_cpu = sorted(result["reschedule_cpu"])
+    cold_cpu, warm_cpu = result["load_cpu"]
+    print(f"schedule build: {cold_cpu * 1000:.1f}ms CPU cold, {warm_cpu * 1000:.1f}ms warm, "
+          f"{result['memory'] / 2**20:.1f}MiB held, {result['peak_memory'] / 2**20:.1f}MiB peak")
+    print(f"rescheduling: {result['fires']} wake-ups, {sum(reschedule_cpu) * 1000:.1f}ms CPU total, "
+          f"p99 {(percentile(reschedule_cpu, 0.99) or 0) * 1000:.2f}ms, max {(reschedule_cpu[-1] if reschedule_cpu else 0) * 1000:.2f}ms")
+    print(f"sends: {len(result['sent'])} sent, {len(expected)} expected, {len(missed)} missed, "
+          f"{duplicates} duplicates, {len(unexpected)} unexpected")
+    late = [value for value in jitter if value > 0]
+    print(f"fire-time jitter: {len(late)} off-time sends, p99 {percentile(jitter, 0.99) or 0:.0f}s, "
+          f"max {jitter[-1] if jitter else 0:.0f}s")
+    for chat_id, local_date in missed[:10]:
+        print(f"  missed {chat_id} {preferences[chat_id]} on {local_date}")
+    for chat_id, at in unexpected[:10]:
+        print(f"  unexpected {chat_id} {preferences[chat_id]} at {at:%Y-%m-%d %H:%M} UTC")
+    # Retried digests are late by design; anything else off-time is not
+    return not (missed or unexpected or duplicates or (late and not digest_failures))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--days", type=float, default=3)
+    parser.add_argument("--start", default="2026-03-27T00:00", help="UTC start time (ISO 8601)")
+    parser.add_argument("--changes-per-day", type=int, default=1000, help="notification time changes per simulated day")
+    parser.add_argument("--digest-failures", type=float, default=0, help="share of digest fetches that fail and are retried")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="keep the scheduler's info logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    ok = run(args.users, args.days, args.start, args.changes_per_day, args.digest_failures, args.seed)
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
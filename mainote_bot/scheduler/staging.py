@@ -0,0 +1,99 @@
+import asyncio
+from mainote_bot.utils.logging import logger
+from mainote_bot.notion.digest import get_chat_digests, is_digest_current
+from mainote_bot.notion.governor import notion_priority, PRIORITY_BACKGROUND
+
+# chat_id -> (fire_at, ChatDigest) prepared ahead of the chat's notification
+_staged = {}
+# (chat_id, fire_at) being staged right now
+_staging = set()
+_staging_tasks = set()
+
+staging_stats = {
+    "staged": 0,
+    "used": 0,
+    "refreshed": 0,
+    "unstaged": 0
+}
+
+async def _stage(entries, limit):
+    with notion_priority(PRIORITY_BACKGROUND):
+        digests = await get_chat_digests([chat_id for chat_id, _ in entries], limit)
+    for chat_id, fire_at in entries:
+        if chat_id in digests:
+            _staged[chat_id] = (fire_at, digests[chat_id])
+    staging_stats["staged"] += len(digests)
+    logger.info(f"Staged digests of {len(digests)} out of {len(entries)} upcoming recipients")
+
+def stage_digests(entries, now, limit=None):
+    """Start preparing the digests of upcoming ``(chat_id, fire_at)`` recipients in the background.
+
+    Recipients already staged (or being staged) for the same time are skipped.
+    """
+    # Staged digests nobody took (the recipient was rescheduled or removed)
+    for chat_id in [chat_id for chat_id, (fire_at, _) in _staged.items() if fire_at < now]:
+        del _staged[chat_id]
+
+    pending = [
+        (chat_id, fire_at) for chat_id, fire_at in entries
+        if (chat_id, fire_at) not in _staging and _staged.get(chat_id, (None,))[0] != fire_at
+    ]
+    if not pending:
+        return
+    _staging.update(pending)
+
+    task = asyncio.create_task(_stage(pending, limit))
+    _staging_tasks.add(task)
+
+    def done(task):
+        _staging_tasks.discard(task)
+        _staging.difference_update(pending)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error staging digests: {str(task.exception())}", exc_info=task.exception())
+
+    task.add_done_callback(done)
+
+async def take_digests(recipients, limit=None):
+    """Get the digests of ``(chat_id, fire_at)`` recipients that are due now.
+
+    Staged digests are used as long as their source has not changed;
+    otherwise, and for recipients that were not staged, the digest is fetched
+    now. If a refresh fails the staged digest is still sent. Returns
+    chat_id -> ChatDigest.
+    """
+    staged = {}
+    for chat_id, fire_at in recipients:
+        entry = _staged.pop(chat_id, None)
+        if entry is not None and entry[0] == fire_at:
+            staged[chat_id] = entry[1]
+
+    recheck = [
+        chat_id for chat_id, _ in recipients
+        if chat_id not in staged or not is_digest_current(staged[chat_id])
+    ]
+    fresh = await get_chat_digests(recheck, limit) if recheck else {}
+
+    digests = {}
+    for chat_id, _ in recipients:
+        if chat_id in fresh:
+            digests[chat_id] = fresh[chat_id]
+            if chat_id not in staged:
+                staging_stats["unstaged"] += 1
+            elif fresh[chat_id].digest_id != staged[chat_id].digest_id:
+                staging_stats["refreshed"] += 1
+            else:
+                staging_stats["used"] += 1
+        elif chat_id in staged:
+            digests[chat_id] = staged[chat_id]
+            staging_stats["used"] += 1
+    return digests
+
+def cancel_staging():
+    """Stop staging in progress and drop staged digests."""
+    for task in list(_staging_tasks):
+        task.cancel()
+    _staged.clear()
+
+def get_staging_stats():
+    """Staging counters, for /health."""
+    return {**staging_stats, "ready": len(_staged), "in_progress": len(_staging)}
\ No newline at end of file
@@ -1,110 +1,73 @@
-from datetime import timedelta
+from collections import defaultdict
+from datetime import datetime, time, timedelta
 import pytz
 from mainote_bot.utils.logging import logger
 
-def calculate_time_without_timezone(user_id, hour, minute, user_time, now, is_fallback=False):
-    """Calculate notification time for a user without timezone set or as fallback."""
-    user_target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-    
-    # If the target time is more than 5 minutes in the past, schedule for tomorrow
-    if (now - user_target_time).total_seconds() > 60:  # 5 minutes
-        user_target_time = user_target_time + timedelta(days=1)
-
-    notification_info = {
-        'time': user_target_time,
-        'seconds': (user_target_time - now).total_seconds(),
-        'user_time': user_time,
-        'timezone': 'UTC (fallback)' if is_fallback else 'UTC (server)'
-    }
-
-    log_prefix = "Fallback: " if is_fallback else ""
-    logger.info(f"{log_prefix}User {user_id} will receive notification at {user_target_time.strftime('%Y-%m-%d %H:%M:%S')} (server time)")
-    return notification_info
-
-async def calculate_time_with_timezone(user_id, hour, minute, user_timezone_str, user_time, now):
-    """Calculate notification time for a user with timezone set."""
-    try:
-        # Get user's timezone
-        user_timezone = pytz.timezone(user_timezone_str)
-
-        # Get current time in user's timezone
-        now_user_tz = now.astimezone(user_timezone)
-
-        # Create target time in user's timezone
-        user_target_time = now_user_tz.replace(hour=hour, minute=minute, second=0, microsecond=0)
-
-        # If the target time is more than 5 minutes in the past, schedule for tomorrow
-        if (now_user_tz - user_target_time).total_seconds() > 60:  # 5 minutes
-            user_target_time = user_target_time + timedelta(days=1)
-
-        # Convert back to UTC for scheduling
-        utc_target_time = user_target_time.astimezone(pytz.UTC)
-
-        notification_info = {
-            'time': utc_target_time,
-            'seconds': (utc_target_time - now).total_seconds(),
-            'user_time': user_time,
-            'timezone': user_timezone_str
-        }
-
-        logger.info(f"User {user_id} will receive notification at {user_time} in {user_timezone_str} (server time: {utc_target_time.strftime('%Y-%m-%d %H:%M:%S')})")
-        return notification_info
-    except Exception as e:
-        logger.error(f"Error converting timezone for user {user_id}: {str(e)}", exc_info=True)
-        # Fall back to server timezone if there's an error
-        return calculate_time_without_timezone(user_id, hour, minute, user_time, now, is_fallback=True)
-
-async def calculate_user_notification_time(user_id, user_time, user_timezone_str, now):
-    """Calculate the next notification time for a user with custom preferences."""
+def get_timezone(timezone_str):
+    """Get a pytz timezone, falling back to UTC if it is missing or unknown."""
+    if not timezone_str:
+        return pytz.UTC
     try:
-        hour, minute = map(int, user_time.split(':'))
-
-        # If user has set a timezone, use it for calculations
-        if user_timezone_str:
-            return await calculate_time_with_timezone(user_id, hour, minute, user_timezone_str, user_time, now)
-        else:
-            # If no timezone set, use server timezone
-            return calculate_time_without_timezone(user_id, hour, minute, user_time, now)
-    except Exception as e:
-        logger.error(f"Error parsing user time preference for {user_id}: {str(e)}", exc_info=True)
-        return None
-
-def calculate_default_notification_times(default_users, now, default_time):
-    """Calculate notification times for users without custom preferences."""
-    next_notifications = {}
-
-    if not default_users:
-        return next_notifications
-
-    # Parse regular notification time
-    hour, minute = map(int, default_time.split(':'))
-
-    # Calculate time until next regular notification in UTC
-    default_target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-    if now >= default_target_time:
-        # If we've already passed the target time today, schedule for tomorrow
-        default_target_time = default_target_time + timedelta(days=1)
-
-    # Add default notification time for users without custom preferences
-    for user_id in default_users:
-        next_notifications[user_id] = {
-            'time': default_target_time,
-            'seconds': (default_target_time - now).total_seconds(),
-            'user_time': default_time,
-            'timezone': 'UTC (default)'
-        }
-
-    logger.info(f"{len(default_users)} users will receive notification at default time {default_target_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-    return next_notifications
-
-def find_earliest_notification(next_notifications):
-    """Find the earliest notification time among all users."""
-    if not next_notifications:
-        return None, None, None
-
-    next_user_id = min(next_notifications, key=lambda x, n=next_notifications: n[x]['seconds'])
-    next_time = next_notifications[next_user_id]['time']
-    seconds_until_next = next_notifications[next_user_id]['seconds']
-
-    logger.info(f"Next notification in {seconds_until_next:.2f} seconds (at {next_time.strftime('%Y-%m-%d %H:%M:%S')})")
-    return next_user_id, next_time, seconds_until_next
\ No newline at end of file
+        return pytz.timezone(timezone_str)
+    except pytz.UnknownTimeZoneError:
+        logger.error(f"Unknown timezone {timezone_str}, using UTC")
+        return pytz.UTC
+
+def next_notification_time(user_time, timezone_str, after):
+    """Get the first UTC time after ``after`` at which it is ``user_time`` (HH:MM) in the timezone.
+
+    The local time is localized separately for each day, so the result stays
+    correct across DST changes.
+    """
+    hour, minute = map(int, user_time.split(':'))
+    tz = get_timezone(timezone_str)
+    local_date = after.astimezone(tz).date()
+    # The target is at most one local day ahead; the third day covers DST shifts
+    for days in range(3):
+        naive_target = datetime.combine(local_date + timedelta(days=days), time(hour, minute))
+        target = tz.localize(naive_target).astimezone(pytz.UTC)
+        if target > after:
+            return target
+
+def notification_local_date(fire_at, user_time, timezone_str):
+    """Get the local date a notification fired at ``fire_at`` (UTC) belongs to.
+
+    Usually the date at ``fire_at`` in the timezone, but a time skipped by a
+    DST change fires later, possibly after midnight; that notification still
+    belongs to the day before.
+    """
+    local = fire_at.astimezone(get_timezone(timezone_str))
+    if not user_time:
+        return local.date()
+    hour, minute = map(int, user_time.split(':'))
+    intended = datetime.combine(local.date(), time(hour, minute))
+    if local.replace(tzinfo=None) < intended - timedelta(hours=12):
+        return local.date() - timedelta(days=1)
+    return local.date()
+
+def group_recipients(recipients):
+    """Group chat IDs by (timezone, notification time).
+
+    ``recipients`` yields ``(chat_id, UserPreferences)``; users without a
+    notification time are left out.
+    """
+    buckets = defaultdict(list)
+    for chat_id, preferences in recipients:
+        if preferences.notification_time:
+            buckets[(preferences.timezone, preferences.notification_time)].append(chat_id)
+    return buckets
+
+def calculate_fire_times(recipients, after):
+    """Calculate the next notification time of many recipients at once.
+
+    Users sharing a (timezone, time) pair need the same UTC instant, so it is
+    calculated once per bucket rather than once per user. Returns a list of
+    ``(fire_at, chat_ids)``.
+    """
+    fire_times = []
+    for (timezone_str, user_time), chat_ids in group_recipients(recipients).items():
+        try:
+            fire_times.append((next_notification_time(user_time, timezone_str, after), chat_ids))
+        except Exception as e:
+            logger.error(f"Error calculating notification time {user_time} ({timezone_str}) for {len(chat_ids)} users: {str(e)}")
+    return fire_times
\ No newline at end of file
@@ -1,63 +1,64 @@
-import json
-import os
+from collections import namedtuple
+from mainote_bot.config import PREFERENCES_CACHE_SIZE, PREFERENCES_CACHE_TTL
 from mainote_bot.utils.logging import logger
+from mainote_bot.utils.lru import LRUCache, MISSING
 from mainote_bot.database import (
     get_user_preferences as db_get_user_preferences,
-    set_user_preferences as db_set_user_preferences,
-    get_all_users_with_preferences as db_get_all_users_with_preferences
+    set_user_notification_time as db_set_user_notification_time,
+    set_user_timezone as db_set_user_timezone,
+    get_all_users_with_preferences as db_get_all_users_with_preferences,
+    get_all_notification_preferences as db_get_all_notification_preferences
 )
 
-# File to store user preferences
-PREFERENCES_FILE = "user_preferences.json"
+# Notification settings of a single user
+UserPreferences = namedtuple('UserPreferences', ['notification_time', 'timezone'])
 
-def load_preferences():
-    """Load user preferences from JSON file."""
-    if not os.path.exists(PREFERENCES_FILE):
-        return {}
+# Read-through cache: chat_id -> UserPreferences, or None for users without preferences
+_preferences_cache = LRUCache(PREFERENCES_CACHE_SIZE, max_age=PREFERENCES_CACHE_TTL)
+# chat_id -> [reads in flight, writes seen by them]; a read is only cached if
+# no write touched the user while it ran, so it cannot replace newer data.
+# Entries exist only while reads are running, which keeps the dict small.
+_reads_in_flight = {}
+# Bumped when the whole cache is cleared, for the same reason
+_cache_epoch = 0
 
-    try:
-        with open(PREFERENCES_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading user preferences: {str(e)}", exc_info=True)
-        return {}
+def _bump_generation(chat_id):
+    reads = _reads_in_flight.get(chat_id)
+    if reads is not None:
+        reads[1] += 1
 
-def save_preferences(preferences):
-    """Save user preferences to JSON file."""
-    try:
-        with open(PREFERENCES_FILE, 'w') as f:
-            json.dump(preferences, f, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving user preferences: {str(e)}", exc_info=True)
-        return False
+def cache_preferences(chat_id, preferences):
+    """Store a user's current preferences (a UserPreferences or None) in the cache.
+
+    Only for values known to be current, i.e. just written or published by the database.
+    """
+    chat_id = str(chat_id)
+    _bump_generation(chat_id)
+    _preferences_cache.set(chat_id, preferences)
 
 async def get_user_notification_time(chat_id):
     """Get notification time for a specific user."""
-    preferences = await db_get_user_preferences(chat_id)
-    return preferences.get('notification_time')
+    preferences = await get_preferences(chat_id)
+    return preferences.notification_time if preferences else None
 
 async def get_user_timezone(chat_id):
     """Get timezone for a specific user."""
-    preferences = await db_get_user_preferences(chat_id)
-    return preferences.get('timezone')
+    preferences = await get_preferences(chat_id)
+    return preferences.timezone if preferences else None
 
 async def set_user_notification_time(chat_id, time):
     """Set notification time for a specific user."""
     try:
-        # Get existing preferences or create new ones
-        preferences = await db_get_user_preferences(chat_id)
-        if not preferences:
-            preferences = {'notification_time': None, 'timezone': None}
-
-        # Update notification time
-        preferences['notification_time'] = time
-
-        # Save to database
-        success = await db_set_user_preferences(chat_id, preferences)
-        if not success:
+        # One statement updates only this column, so concurrent changes to the timezone are kept
+        _bump_generation(str(chat_id))
+        row = await db_set_user_notification_time(chat_id, time)
+        if row is None:
+            _bump_generation(str(chat_id))
+            _preferences_cache.pop(str(chat_id))
             logger.error(f"Failed to save notification time {time} for chat ID {chat_id}")
-        return success
+            return False
+        cache_preferences(chat_id, UserPreferences(row['notification_time'], row['timezone']))
+        return True
     except Exception as e:
         logger.error(f"Error setting notification time for chat ID {chat_id}: {str(e)}", exc_info=True)
         return False
@@ -65,23 +66,70 @@ async def set_user_notification_time(chat_id, time):
 async def set_user_timezone(chat_id, timezone):
     """Set timezone for a specific user."""
     try:
-        # Get existing preferences or create new ones
-        preferences = await db_get_user_preferences(chat_id)
-        if not preferences:
-            preferences = {'notification_time': None, 'timezone': None}
-
-        # Update timezone
-        preferences['timezone'] = timezone
-
-        # Save to database
-        success = await db_set_user_preferences(chat_id, preferences)
-        if not success:
+        # One statement updates only this column, so concurrent changes to the time are kept
+        _bump_generation(str(chat_id))
+        row = await db_set_user_timezone(chat_id, timezone)
+        if row is None:
+            _bump_generation(str(chat_id))
+            _preferences_cache.pop(str(chat_id))
             logger.error(f"Failed to save timezone {timezone} for chat ID {chat_id}")
-        return success
+            return False
+        cache_preferences(chat_id, UserPreferences(row['notification_time'], row['timezone']))
+        return True
     except Exception as e:
         logger.error(f"Error setting timezone for chat ID {chat_id}: {str(e)}", exc_info=True)
         return False
 
 async def get_all_users_with_preferences():
     """Get all users who have set preferences."""
-    return await db_get_all_users_with_preferences()
\ No newline at end of file
+    return await db_get_all_users_with_preferences()
+
+async def get_preferences(chat_id):
+    """Get the notification settings of a user, or None if they have none.
+
+    Served from the cache when possible; database errors are not cached.
+    """
+    chat_id = str(chat_id)
+    preferences = _preferences_cache.get(chat_id)
+    if preferences is not MISSING:
+        return preferences
+
+    reads = _reads_in_flight.setdefault(chat_id, [0, 0])
+    reads[0] += 1
+    generation = (_cache_epoch, reads[1])
+    try:
+        row = await db_get_user_preferences(chat_id)
+    finally:
+        reads[0] -= 1
+        if not reads[0]:
+            del _reads_in_flight[chat_id]
+    if row is None:
+        return None
+    preferences = UserPreferences(row.get('notification_time'), row.get('timezone')) if row else None
+    # A write that ran meanwhile has cached something newer (or dropped the entry)
+    if (_cache_epoch, reads[1]) == generation:
+        _preferences_cache.set(chat_id, preferences)
+    return preferences
+
+def clear_preferences_cache():
+    """Forget every cached user, e.g. after a bulk import."""
+    global _cache_epoch
+    _cache_epoch += 1
+    _preferences_cache.clear()
+
+def preferences_cache_stats():
+    """Hit/miss counters of the preference cache, for /health."""
+    return _preferences_cache.stats()
+
+async def get_all_preferences():
+    """Get the notification settings of every user, keyed by chat ID.
+
+    Loaded with a single query; returns None if the database could not be read.
+    """
+    rows = await db_get_all_notification_preferences()
+    if rows is None:
+        return None
+    return {
+        chat_id: UserPreferences(notification_time, timezone)
+        for chat_id, notification_time, timezone in rows
+    }
\ No newline at end of file
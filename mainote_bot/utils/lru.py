@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+
+# Sentinel distinguishing "not cached" from a cached None
+MISSING = object()
+
+class LRUCache:
+    """Bounded least-recently-used cache with optional idle and age expiry.
+
+    Entries untouched for ``ttl`` seconds are dropped lazily on access, so the
+    cache never needs a background sweeper. Entries stored more than
+    ``max_age`` seconds ago are treated as missing, which bounds staleness of
+    frequently read values. ``on_evict(key, value)`` is called for every entry
+    removed because of size or idleness.
+    """
+
+    def __init__(self, max_size, ttl=None, max_age=None, on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_age = max_age
+        self._on_evict = on_evict
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not MISSING
+
+    def _evict(self, key, value):
+        self.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def _expire(self, now):
+        if self.ttl is None:
+            return
+        # Entries are ordered by last use, so idle ones sit at the front
+        while self._entries:
+            key, (value, _, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.ttl:
+                break
+            del self._entries[key]
+            self._evict(key, value)
+
+    def get(self, key, default=MISSING, count=True):
+        """Return the cached value and mark it as recently used."""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None and self.max_age is not None and now - entry[1] >= self.max_age:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            if count:
+                self.misses += 1
+            return default
+        self._entries[key] = (entry[0], entry[1], now)
+        self._entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries if full."""
+        now = time.monotonic()
+        self._expire(now)
+        self._entries[key] = (value, now, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            old_key, (old_value, _, _) = self._entries.popitem(last=False)
+            self._evict(old_key, old_value)
+
+    def pop(self, key, default=None):
+        """Remove a key without counting it as an eviction."""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        """Remove every entry."""
+        self._entries.clear()
+
+    def stats(self):
+        """Return size and hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None
+        }
@@ -5,7 +5,14 @@ from datetime import datetime
 from fastapi import APIRouter, Request, HTTPException
 from telegram import Update
 from mainote_bot.utils.logging import logger
-from mainote_bot.database import get_pool
+from mainote_bot.database import acquire, pool_stats
+from mainote_bot.notion.tasks import active_tasks_cache
+from mainote_bot.notion.client import governor as notion_governor, breaker as notion_breaker, tenant_clients
+from mainote_bot.notion.breaker import hedge_stats
+import mainote_bot.scheduler.delivery as delivery
+from mainote_bot.scheduler.shards import shard_stats
+from mainote_bot.scheduler.staging import get_staging_stats
+from mainote_bot.user_preferences import preferences_cache_stats
 
 router = APIRouter()
 
@@ -78,8 +85,7 @@ async def health(request: Request):
     
     # Check PostgreSQL database
     try:
-        pool = await get_pool()
-        async with pool.acquire() as conn:
+        async with acquire() as conn:
             # Simple query to test database connectivity
             result = await conn.fetchval('SELECT 1')
             if result == 1:
@@ -154,6 +160,31 @@ async def health(request: Request):
         "total_services": total_services,
         "health_percentage": round((healthy_services / total_services) * 100, 1)
     }
+
+    # Notion circuit breaker state, request governor queue depth and wait times
+    health_status["notion"] = {
+        "breaker": notion_breaker.stats(),
+        "hedging": hedge_stats,
+        "governor": notion_governor.stats(),
+        "tenant_clients": tenant_clients.stats()
+    }
+
+    # Morning notification throughput and delivery lag of the last run
+    health_status["notifications"] = {
+        "last_delivery": delivery.last_delivery_stats,
+        "telegram_governor": delivery.telegram_governor.stats(),
+        "scheduler": shard_stats(),
+        "staging": get_staging_stats()
+    }
+
+    # Connection pool usage and acquire wait times
+    health_status["database_pool"] = pool_stats()
+
+    # Cache effectiveness counters
+    health_status["caches"] = {
+        "active_tasks": active_tasks_cache.stats(),
+        "user_preferences": preferences_cache_stats()
+    }
     
     # Return appropriate HTTP status code
     if overall_healthy: